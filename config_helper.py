@@ -3,50 +3,110 @@
 Configuration validation and helper utilities for the email sync project.
 """
 
+import argparse
+import hashlib
 import json
+import os
 import sys
-from typing import Dict, List
-import logging
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+# Parses and serializes with orjson when it is installed
+from json_compat import dumps, loads
+
+
+# Keys that every configuration must provide
+_REQUIRED_TOP_KEYS = ('source_mailbox', 'target_mailbox')
+_REQUIRED_MAILBOX_KEYS = ('server', 'username')
+_LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+_VALID_LOG_LEVELS = frozenset(_LOG_LEVELS)
+_STANDARD_SEARCH_KEYS = frozenset(('subject', 'from', 'to', 'body', 'date_after', 'before_date', 'larger', 'smaller'))
+
+
+@lru_cache(maxsize=16)
+def _load_config_cached(path: str, mtime_ns: int, size: int) -> Dict:
+    """
+    Read and parse a JSON configuration file.
+
+    The modification time and size are part of the cache key, so an edited
+    file is re-read while repeated loads of an unchanged file skip disk I/O
+    and parsing.
+    """
+    with open(path, 'rb') as f:
+        return loads(f.read())
+
+
+def load_config(config_file: str) -> Dict:
+    """
+    Load a configuration file, reusing the parsed result while it is unchanged.
+
+    The returned dictionary is shared between callers and must not be modified.
+
+    Raises:
+        FileNotFoundError: If the configuration file does not exist
+        json.JSONDecodeError: If the configuration file is not valid JSON
+    """
+    stat = os.stat(config_file)
+    return _load_config_cached(os.path.abspath(config_file), stat.st_mtime_ns, stat.st_size)
 
 
 def validate_config(config: Dict) -> List[str]:
     """
     Validate the configuration file and return a list of errors.
     
+    Results are remembered for the last few distinct configurations, keyed
+    by their canonical (sorted-key) JSON form.
+    
     Args:
         config: Configuration dictionary
         
     Returns:
         List of validation error messages (empty if valid)
     """
+    try:
+        signature = dumps(config, sort_keys=True)
+    except (TypeError, ValueError):
+        # Not JSON-serializable, so it cannot have come from a config file
+        return list(_validate_config(config))
+    return list(_validate_signature(signature))
+
+
+@lru_cache(maxsize=5)
+def _validate_signature(signature: str) -> Tuple[str, ...]:
+    """Validate the configuration serialized as signature."""
+    return _validate_config(loads(signature))
+
+
+def _validate_config(config: Dict) -> Tuple[str, ...]:
+    """Validate a configuration dictionary, returning its errors as a tuple."""
     errors = []
     
     # Required top-level keys
-    required_keys = ['source_mailbox', 'target_mailbox']
-    for key in required_keys:
-        if key not in config:
-            errors.append(f"Missing required configuration key: {key}")
+    errors.extend(f"Missing required configuration key: {key}"
+                  for key in _REQUIRED_TOP_KEYS if key not in config)
     
     # Validate mailbox configurations
-    for mailbox_type in ['source_mailbox', 'target_mailbox']:
+    for mailbox_type in _REQUIRED_TOP_KEYS:
         if mailbox_type in config:
             mailbox_config = config[mailbox_type]
+            if not isinstance(mailbox_config, dict):
+                errors.append(f"{mailbox_type} must be an object")
+                continue
             
             # Required keys depend on auth method
             auth_method = mailbox_config.get('auth_method', 'password')
-            required_mailbox_keys = ['server', 'username']
+            required_mailbox_keys = _REQUIRED_MAILBOX_KEYS
             
             if auth_method == 'password':
-                required_mailbox_keys.append('password')
+                required_mailbox_keys += ('password',)
             elif auth_method == 'oauth2':
                 # OAuth2 doesn't require password, but may have optional credential files
                 pass
             else:
                 errors.append(f"Invalid auth_method in {mailbox_type}: {auth_method}. Must be 'password' or 'oauth2'")
             
-            for key in required_mailbox_keys:
-                if key not in mailbox_config:
-                    errors.append(f"Missing required key '{key}' in {mailbox_type}")
+            errors.extend(f"Missing required key '{key}' in {mailbox_type}"
+                          for key in required_mailbox_keys if key not in mailbox_config)
             
             # Validate port if specified
             if 'port' in mailbox_config:
@@ -59,24 +119,64 @@ def validate_config(config: Dict) -> List[str]:
     
     # Validate log level if specified
     if 'log_level' in config:
-        valid_levels = ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']
-        if config['log_level'].upper() not in valid_levels:
-            errors.append(f"Invalid log_level: {config['log_level']}. Must be one of {valid_levels}")
+        if not isinstance(config['log_level'], str):
+            errors.append(f"log_level must be a string. Must be one of {list(_LOG_LEVELS)}")
+        elif config['log_level'].upper() not in _VALID_LOG_LEVELS:
+            errors.append(f"Invalid log_level: {config['log_level']}. Must be one of {list(_LOG_LEVELS)}")
     
     # Validate search criteria if specified
     if 'search_criteria' in config:
         search_criteria = config['search_criteria']
-        
-        # Check if both Gmail query and standard criteria are provided (warn)
-        has_gmail_query = 'gmail_query' in search_criteria
-        standard_keys = ['subject', 'from', 'to', 'body', 'date_after', 'before_date']
-        has_standard_criteria = any(key in search_criteria for key in standard_keys)
-        
-        if has_gmail_query and has_standard_criteria:
-            # This is not an error, but worth noting
-            pass  # Gmail query takes precedence for Gmail servers
+        if not isinstance(search_criteria, dict):
+            errors.append("search_criteria must be an object")
+        else:
+            # Check if both Gmail query and standard criteria are provided (warn)
+            has_gmail_query = 'gmail_query' in search_criteria
+            has_standard_criteria = not _STANDARD_SEARCH_KEYS.isdisjoint(search_criteria)
+            
+            if has_gmail_query and has_standard_criteria:
+                # This is not an error, but worth noting
+                pass  # Gmail query takes precedence for Gmail servers
+            
+            # Validate size limits, which build_imap_search formats as IMAP numbers
+            for key in ('larger', 'smaller'):
+                if search_criteria.get(key):
+                    try:
+                        if int(search_criteria[key]) < 0:
+                            errors.append(f"Invalid {key} in search_criteria: {search_criteria[key]}")
+                    except (ValueError, TypeError):
+                        errors.append(f"{key} must be a number of bytes in search_criteria")
     
-    return errors
+    return tuple(errors)
+
+
+def validate_config_file(config_file: str) -> List[str]:
+    """
+    Load and validate a configuration file.
+
+    Args:
+        config_file: Path to the JSON configuration file
+
+    Returns:
+        List of validation error messages (empty if valid)
+
+    Raises:
+        FileNotFoundError: If the configuration file does not exist
+        json.JSONDecodeError: If the configuration file is not valid JSON
+    """
+    return validate_config(load_config(config_file))
+
+
+def write_config(config_file: str, config: Dict) -> None:
+    """
+    Write a configuration dictionary to a JSON file with 2-space indentation.
+    
+    Args:
+        config_file: Destination path
+        config: Configuration dictionary
+    """
+    with open(config_file, 'w', encoding='utf-8') as f:
+        f.write(dumps(config, indent=True))
 
 
 def create_sample_config() -> Dict:
@@ -110,53 +210,117 @@ def create_sample_config() -> Dict:
     }
 
 
-def main():
-    """CLI utility for config management."""
-    if len(sys.argv) > 1:
-        command = sys.argv[1]
+def _validated_stamp_path(config_file: str) -> str:
+    """Path of the stamp file recording the last successful validation."""
+    directory, name = os.path.split(config_file)
+    return os.path.join(directory, f".{name}.validated")
+
+
+@lru_cache(maxsize=None)
+def _validator_hash() -> str:
+    """Hash of this module's source, so stamps from other validator versions are ignored."""
+    with open(__file__, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+def _file_signature(config_file: str) -> str:
+    """Identify the current contents of a file by modification time and size,
+    and the validator that checked it."""
+    stat = os.stat(config_file)
+    return f"{_validator_hash()}:{stat.st_mtime}:{stat.st_size}"
+
+
+def _cmd_validate(config_file: str) -> None:
+    """Validate a configuration file and exit non-zero on errors."""
+    stamp_file = _validated_stamp_path(config_file)
+    try:
+        # Skip parsing entirely if the file is unchanged since it last validated
+        signature = _file_signature(config_file)
+        try:
+            with open(stamp_file, 'r') as f:
+                if f.read() == signature:
+                    print(f"Configuration {config_file} is valid (cached)")
+                    return
+        except OSError:
+            pass
         
-        if command == "validate":
-            config_file = sys.argv[2] if len(sys.argv) > 2 else "config.json"
+        errors = validate_config_file(config_file)
+        if errors:
+            print(f"Configuration errors in {config_file}:")
+            for error in errors:
+                print(f"  - {error}")
+            sys.exit(1)
+        else:
+            print(f"Configuration {config_file} is valid!")
             try:
-                with open(config_file, 'r') as f:
-                    config = json.load(f)
-                
-                errors = validate_config(config)
-                if errors:
-                    print(f"Configuration errors in {config_file}:")
-                    for error in errors:
-                        print(f"  - {error}")
-                    sys.exit(1)
-                else:
-                    print(f"Configuration {config_file} is valid!")
-                    
-            except FileNotFoundError:
-                print(f"Configuration file {config_file} not found")
-                sys.exit(1)
-            except json.JSONDecodeError as e:
-                print(f"Error parsing {config_file}: {e}")
-                sys.exit(1)
-                
-        elif command == "create":
-            config_file = sys.argv[2] if len(sys.argv) > 2 else "config.json"
-            sample_config = create_sample_config()
+                with open(stamp_file, 'w') as f:
+                    f.write(signature)
+            except OSError:
+                pass
             
-            try:
-                with open(config_file, 'w') as f:
-                    json.dump(sample_config, f, indent=2)
-                print(f"Sample configuration created: {config_file}")
-                print("Please edit the file with your actual IMAP settings.")
-            except Exception as e:
-                print(f"Error creating config file: {e}")
-                sys.exit(1)
-        else:
-            print("Unknown command. Use 'validate' or 'create'")
-            sys.exit(1)
-    else:
-        print("Usage:")
-        print("  python config_helper.py validate [config_file]")
-        print("  python config_helper.py create [config_file]")
+    except FileNotFoundError:
+        print(f"Configuration file {config_file} not found")
+        sys.exit(1)
+    except json.JSONDecodeError as e:
+        print(f"Error parsing {config_file}: {e}")
+        sys.exit(1)
+
+
+def _cmd_create(config_file: str) -> None:
+    """Write a sample configuration file."""
+    sample_config = create_sample_config()
+    
+    try:
+        write_config(config_file, sample_config)
+        print(f"Sample configuration created: {config_file}")
+        print("Please edit the file with your actual IMAP settings.")
+    except Exception as e:
+        print(f"Error creating config file: {e}")
+        sys.exit(1)
+
+
+_COMMANDS = {
+    'validate': (_cmd_validate, 'Validate a configuration file'),
+    'create': (_cmd_create, 'Create a sample configuration file'),
+}
+
+
+def _print_usage() -> None:
+    """Print the short usage summary."""
+    print("Usage:")
+    print("  python config_helper.py validate [config_file]")
+    print("  python config_helper.py create [config_file]")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the command-line argument parser."""
+    parser = argparse.ArgumentParser(description='Configuration helper for the email sync project')
+    subparsers = parser.add_subparsers(dest='command')
+    for name, (_, help_text) in _COMMANDS.items():
+        subparser = subparsers.add_parser(name, help=help_text)
+        subparser.add_argument('config_file', nargs='?', default='config.json',
+                               help='Configuration file path (default: config.json)')
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """CLI utility for config management."""
+    if argv is None:
+        argv = sys.argv[1:]
+    
+    # Print usage without building the parser when called with no arguments
+    if not argv:
+        _print_usage()
+        return
+    
+    if argv[0] not in _COMMANDS and argv[0] not in ('-h', '--help'):
+        print("Unknown command. Use 'validate' or 'create'")
+        sys.exit(1)
+    
+    args = build_parser().parse_args(argv)
+    command, _ = _COMMANDS[args.command]
+    command(args.config_file)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
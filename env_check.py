@@ -4,10 +4,30 @@ Environment check utility for Email Sync Project
 Provides information about the current Python environment and dependencies.
 """
 
+import io
 import sys
 import os
-import subprocess
-from pathlib import Path
+from contextlib import redirect_stdout
+from importlib.util import find_spec
+
+
+# Computed once; several checks and the recommendations need the same answers
+_IN_VENV = hasattr(sys, 'real_prefix') or (
+    hasattr(sys, 'base_prefix') and sys.base_prefix != sys.prefix
+)
+
+
+def _refresh_cwd_cache():
+    """Re-read the working directory listing used by the existence checks."""
+    global _CWD_ENTRIES, _HAS_VENV_DIR, _HAS_CONFIG
+    _CWD_ENTRIES = frozenset(entry.name for entry in os.scandir('.'))
+    _HAS_VENV_DIR = 'venv' in _CWD_ENTRIES
+    _HAS_CONFIG = 'config.json' in _CWD_ENTRIES
+
+
+# Every checked file lives in the working directory, so list it once
+# instead of issuing one stat() per file
+_refresh_cwd_cache()
 
 
 def check_python_version():
@@ -25,9 +45,7 @@ def check_python_version():
 
 def check_virtual_environment():
     """Check virtual environment status."""
-    in_venv = hasattr(sys, 'real_prefix') or (
-        hasattr(sys, 'base_prefix') and sys.base_prefix != sys.prefix
-    )
+    in_venv = _IN_VENV
     
     print(f"📦 Virtual Environment: {'Active' if in_venv else 'Not Active'}")
     
@@ -35,7 +53,7 @@ def check_virtual_environment():
         print(f"   📁 Path: {sys.prefix}")
         print("   ✅ Using virtual environment")
     else:
-        if Path('venv').exists():
+        if _HAS_VENV_DIR:
             print("   ⚠️  Virtual environment found but not activated")
             print("   💡 Run: source venv/bin/activate (Linux/macOS) or venv\\Scripts\\activate (Windows)")
         else:
@@ -45,43 +63,45 @@ def check_virtual_environment():
     return in_venv
 
 
+def _module_available(module_name):
+    """Check whether a module can be imported, without executing it."""
+    try:
+        return find_spec(module_name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
 def check_dependencies():
     """Check if required dependencies are installed."""
     print("📚 Dependencies:")
     
-    required_packages = [
-        'imaplib2',
-        'email-validator',
-        'python-dotenv'
-    ]
+    # Package name -> importable module name
+    required_packages = {
+        'imaplib2': 'imaplib2',
+        'email-validator': 'email_validator',
+        'python-dotenv': 'dotenv'
+    }
     
-    optional_packages = [
-        'google-auth',
-        'google-auth-oauthlib',
-        'google-auth-httplib2'
-    ]
+    optional_packages = {
+        'google-auth': 'google.auth',
+        'google-auth-oauthlib': 'google_auth_oauthlib',
+        'google-auth-httplib2': 'google_auth_httplib2'
+    }
     
     all_good = True
     
-    for package in required_packages:
-        try:
-            __import__(package.replace('-', '_'))
+    for package, module_name in required_packages.items():
+        if _module_available(module_name):
             print(f"   ✅ {package}")
-        except ImportError:
+        else:
             print(f"   ❌ {package} (required)")
             all_good = False
     
     oauth_available = True
-    for package in optional_packages:
-        try:
-            if package == 'google-auth':
-                import google.auth
-            elif package == 'google-auth-oauthlib':
-                import google_auth_oauthlib
-            elif package == 'google-auth-httplib2':
-                import google.auth.httplib2
+    for package, module_name in optional_packages.items():
+        if _module_available(module_name):
             print(f"   ✅ {package} (optional - OAuth2)")
-        except ImportError:
+        else:
             print(f"   ⚠️  {package} (optional - OAuth2)")
             oauth_available = False
     
@@ -100,21 +120,22 @@ def check_configuration():
     config_files = ['config.json', 'config.example.json', 'config.oauth2.example.json']
     
     for config_file in config_files:
-        if Path(config_file).exists():
+        if config_file in _CWD_ENTRIES:
             print(f"   ✅ {config_file}")
         else:
             print(f"   ❌ {config_file}")
     
-    if Path('config.json').exists():
+    if _HAS_CONFIG:
         try:
-            # Try to validate config
-            result = subprocess.run([sys.executable, 'config_helper.py', 'validate'], 
-                                  capture_output=True, text=True)
-            if result.returncode == 0:
+            # Validate in-process rather than spawning config_helper.py
+            from config_helper import validate_config_file
+            errors = validate_config_file('config.json')
+            if not errors:
                 print("   ✅ Configuration is valid")
             else:
                 print("   ❌ Configuration has errors")
-                print(f"      {result.stderr.strip()}")
+                for error in errors:
+                    print(f"      {error}")
         except Exception as e:
             print(f"   ⚠️  Could not validate config: {e}")
     else:
@@ -125,16 +146,13 @@ def check_oauth2_setup():
     """Check OAuth2 setup."""
     print("🔐 OAuth2 Setup:")
     
-    credentials_file = Path('credentials.json')
-    token_file = Path('token.json')
-    
-    if credentials_file.exists():
+    if 'credentials.json' in _CWD_ENTRIES:
         print("   ✅ credentials.json found")
     else:
         print("   ❌ credentials.json not found")
         print("   💡 Download from Google Cloud Console")
     
-    if token_file.exists():
+    if 'token.json' in _CWD_ENTRIES:
         print("   ✅ token.json found (OAuth2 authorized)")
     else:
         print("   ⚠️  token.json not found (need to authorize)")
@@ -149,13 +167,14 @@ def check_project_files():
         'sync_mail.py',
         'oauth2_helper.py',
         'config_helper.py',
+        'json_compat.py',
         'requirements.txt'
     ]
     
     all_present = True
     
     for file_name in required_files:
-        if Path(file_name).exists():
+        if file_name in _CWD_ENTRIES:
             print(f"   ✅ {file_name}")
         else:
             print(f"   ❌ {file_name}")
@@ -169,22 +188,24 @@ def run_quick_test():
     print("🧪 Quick Test:")
     
     try:
-        # Test main script help
-        result = subprocess.run([sys.executable, 'sync_mail.py', '--help'], 
-                              capture_output=True, text=True, timeout=10)
-        if result.returncode == 0:
+        # Test main script help (in-process instead of spawning sync_mail.py)
+        try:
+            from sync_mail import build_parser
+            build_parser().format_help()
             print("   ✅ Main script functional")
-        else:
+        except ImportError as e:
             print("   ❌ Main script has issues")
+            print(f"      {e}")
             return False
         
         # Test OAuth2 helper
-        result = subprocess.run([sys.executable, 'oauth2_helper.py', '--setup'], 
-                              capture_output=True, text=True, timeout=10)
-        if result.returncode == 0:
+        try:
+            from oauth2_helper import OAuth2Helper
+            OAuth2Helper().setup_oauth2_credentials()
             print("   ✅ OAuth2 helper functional")
-        else:
+        except ImportError as e:
             print("   ❌ OAuth2 helper has issues")
+            print(f"      {e}")
             return False
         
         return True
@@ -199,58 +220,84 @@ def print_recommendations():
     print("\n💡 Recommendations:")
     
     # Check if venv exists but not active
-    if Path('venv').exists() and not (hasattr(sys, 'real_prefix') or 
-                                     (hasattr(sys, 'base_prefix') and sys.base_prefix != sys.prefix)):
+    if _HAS_VENV_DIR and not _IN_VENV:
         print("   1. Activate virtual environment: source venv/bin/activate")
     
     # Check if setup hasn't been run
-    if not Path('venv').exists():
+    if not _HAS_VENV_DIR:
         print("   1. Run automated setup: ./setup.sh")
     
     # Check if config doesn't exist
-    if not Path('config.json').exists():
+    if not _HAS_CONFIG:
         print("   2. Create configuration: cp config.example.json config.json")
         print("   3. Edit config.json with your IMAP settings")
     
     # Check for OAuth2 setup
-    if not Path('credentials.json').exists():
+    if 'credentials.json' not in _CWD_ENTRIES:
         print("   4. For Gmail OAuth2: Follow OAUTH2_SETUP.md guide")
     
     print("   5. Test setup: python sync_mail.py --dry-run")
 
 
+# Basic checks in the order they run. check_python_version comes first so the
+# more expensive dependency scan is skipped on an unsupported interpreter.
+_BASIC_CHECKS = (
+    ('python', check_python_version),
+    ('venv', check_virtual_environment),
+    ('dependencies', check_dependencies),
+    ('project_files', check_project_files),
+)
+
+# Basic checks whose failure makes the remaining checks pointless
+_REQUIRED_CHECKS = frozenset({'python'})
+
+
+def _run_phase(check):
+    """Run a check with its output collected and written to stdout in one go."""
+    buffer = io.StringIO()
+    with redirect_stdout(buffer):
+        result = check()
+    sys.stdout.write(buffer.getvalue())
+    sys.stdout.flush()
+    return result
+
+
 def main():
     """Main check routine."""
     print("🔍 Email Sync Project Environment Check")
     print("=" * 50)
     
-    checks = [
-        check_python_version(),
-        check_virtual_environment(),
-        check_dependencies(),
-        check_project_files(),
-    ]
+    # Run basic checks in order; a failed required phase skips everything after it
+    checks_passed = True
+    aborted = False
+    for name, check in _BASIC_CHECKS:
+        passed = _run_phase(check)
+        checks_passed = checks_passed and passed
+        if not passed and name in _REQUIRED_CHECKS:
+            aborted = True
+            break
     
     print()
-    check_configuration()
-    print()
-    check_oauth2_setup()
-    print()
+    if not aborted:
+        _run_phase(check_configuration)
+        print()
+        _run_phase(check_oauth2_setup)
+        print()
     
     # Only run quick test if basic checks pass
-    if all(checks):
-        test_passed = run_quick_test()
+    if checks_passed:
+        test_passed = _run_phase(run_quick_test)
     else:
         test_passed = False
     
     print("\n" + "=" * 50)
     
-    if all(checks) and test_passed:
+    if checks_passed and test_passed:
         print("🎉 Environment check passed! Project is ready to use.")
     else:
         print("⚠️  Some issues found. See recommendations below.")
     
-    print_recommendations()
+    _run_phase(print_recommendations)
 
 
 if __name__ == "__main__":
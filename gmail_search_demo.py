@@ -3,7 +3,7 @@
 Gmail Search Demo - Shows how Gmail vs standard search is selected
 """
 
-from sync_mail import is_gmail_server
+from sync_mail import build_imap_search, is_gmail_server
 
 
 def demo_search_selection():
@@ -53,10 +53,6 @@ def demo_search_selection():
     ]
     
     for i, config in enumerate(test_configs, 1):
-        print(f"\n{i}. {config['name']}")
-        print(f"   Server: {config['server']}")
-        print(f"   Is Gmail: {is_gmail_server(config['server'])}")
-        
         criteria = config['criteria']
         server = config['server']
         
@@ -64,29 +60,20 @@ def demo_search_selection():
         is_gmail = is_gmail_server(server)
         has_gmail_query = 'gmail_query' in criteria
         
+        print(f"\n{i}. {config['name']}")
+        print(f"   Server: {server}")
+        print(f"   Is Gmail: {is_gmail}")
+        
         if is_gmail and has_gmail_query:
             print(f"   🚀 Will use Gmail search: {criteria['gmail_query']}")
             print(f"   📝 Gmail query will take precedence")
         else:
             # Build standard IMAP search
-            search_terms = []
-            if 'subject' in criteria:
-                search_terms.append(f'SUBJECT "{criteria["subject"]}"')
-            if 'from' in criteria:
-                search_terms.append(f'FROM "{criteria["from"]}"')
-            if 'date_after' in criteria:
-                search_terms.append(f'SINCE "{criteria["date_after"]}"')
-            if 'body' in criteria:
-                search_terms.append(f'BODY "{criteria["body"]}"')
-            
-            if not search_terms:
-                search_terms = ['ALL']
-            
-            search_string = ' '.join(search_terms)
+            search_string = build_imap_search(criteria)
             search_type = "Gmail fallback" if is_gmail else "Standard IMAP"
             print(f"   📧 Will use {search_type} search: {search_string}")
         
-        if is_gmail and 'gmail_query' in criteria and any(k in criteria for k in ['subject', 'from', 'date_after']):
+        if is_gmail and has_gmail_query and any(k in criteria for k in ['subject', 'from', 'date_after']):
             print(f"   💡 Note: Standard criteria present but Gmail query takes precedence")
     
     print("\n" + "=" * 55)
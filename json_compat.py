@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+JSON helpers for Email Sync Project
+Uses orjson (C extension) when it is installed and the standard json module
+otherwise. Invalid input raises json.JSONDecodeError either way (orjson's
+error is a subclass of it).
+"""
+
+import json
+
+# Optional dependency; the standard library is the fallback
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+if orjson is not None:
+    loads = orjson.loads
+
+    def dumps(obj, indent: bool = False, sort_keys: bool = False) -> str:
+        """Serialize obj to a JSON string, indented by two spaces if requested."""
+        option = (orjson.OPT_INDENT_2 if indent else 0) | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        return orjson.dumps(obj, option=option).decode('utf-8')
+else:
+    loads = json.loads
+
+    def dumps(obj, indent: bool = False, sort_keys: bool = False) -> str:
+        """Serialize obj to a JSON string, indented by two spaces if requested."""
+        return json.dumps(obj, indent=2 if indent else None, sort_keys=sort_keys)
@@ -9,28 +9,55 @@ Author: Auto-generated
 Date: 2025-10-19
 """
 
-import json
+from __future__ import annotations
+
 import base64
+import importlib.util
 import os
 import logging
-from typing import Dict, Optional, Tuple
+import threading
+from collections import namedtuple
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
 from pathlib import Path
 
-try:
-    from google.auth.transport.requests import Request
+# Parses with orjson when it is installed
+from json_compat import loads as _json_loads
+
+if TYPE_CHECKING:
     from google.oauth2.credentials import Credentials
-    from google_auth_oauthlib.flow import InstalledAppFlow
-    import google.auth.exceptions
-    OAUTH2_AVAILABLE = True
-except ImportError:
-    # Create placeholder classes for type hints when imports fail
-    class Credentials:
-        pass
-    class Request:
-        pass
-    class InstalledAppFlow:
-        pass
-    OAUTH2_AVAILABLE = False
+
+
+def _module_available(name: str) -> bool:
+    """Check whether a module can be imported without importing it."""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+# The Google auth stack is heavy to import, so only probe for it here and
+# defer the actual imports until OAuth2 is used (see _lazy_import).
+OAUTH2_AVAILABLE = all(
+    _module_available(name)
+    for name in ('google.auth', 'google.oauth2', 'google_auth_oauthlib')
+)
+
+_OAuth2Symbols = namedtuple(
+    '_OAuth2Symbols', ['Request', 'Credentials', 'InstalledAppFlow', 'RefreshError']
+)
+_oauth2_symbols: Optional[_OAuth2Symbols] = None
+
+
+def _lazy_import() -> _OAuth2Symbols:
+    """Import the Google auth libraries on first use and return the needed symbols."""
+    global _oauth2_symbols
+    if _oauth2_symbols is None:
+        from google.auth.transport.requests import Request
+        from google.oauth2.credentials import Credentials
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        from google.auth.exceptions import RefreshError
+        _oauth2_symbols = _OAuth2Symbols(Request, Credentials, InstalledAppFlow, RefreshError)
+    return _oauth2_symbols
 
 
 class OAuth2Helper:
@@ -52,6 +79,9 @@ class OAuth2Helper:
         self.credentials_file = credentials_file
         self.token_file = token_file
         self.logger = logging.getLogger(__name__)
+        self._creds: Optional[Credentials] = None
+        self._xoauth2_cache: Optional[Tuple[str, str, str]] = None
+        self._lock = threading.Lock()
         
         if not OAUTH2_AVAILABLE:
             self.logger.warning(
@@ -69,32 +99,47 @@ class OAuth2Helper:
         if not OAUTH2_AVAILABLE:
             self.logger.error("OAuth2 dependencies not available")
             return None
-            
-        creds = None
         
-        # Load existing token if available
-        if os.path.exists(self.token_file):
-            try:
-                creds = Credentials.from_authorized_user_file(self.token_file, self.SCOPES)
-                self.logger.info("Loaded existing OAuth2 token")
-            except Exception as e:
-                self.logger.warning(f"Error loading token file: {e}")
+        # Serialize loading/refreshing when both mailboxes share this helper
+        # and connect concurrently
+        with self._lock:
+            # Reuse credentials loaded earlier while they are still valid
+            if self._creds and self._creds.valid:
+                return self._creds
+        
+            sym = _lazy_import()
+            creds = self._creds
+        
+            # Load existing token if available
+            if creds is None and os.path.exists(self.token_file):
+                try:
+                    with open(self.token_file, 'rb') as f:
+                        token_info = _json_loads(f.read())
+                    creds = sym.Credentials.from_authorized_user_info(token_info, self.SCOPES)
+                    self.logger.info("Loaded existing OAuth2 token")
+                except Exception as e:
+                    self.logger.warning(f"Error loading token file: {e}")
         
-        # Refresh token if expired
-        if creds and creds.expired and creds.refresh_token:
-            try:
-                creds.refresh(Request())
-                self.logger.info("Refreshed OAuth2 token")
-                self._save_credentials(creds)
-            except google.auth.exceptions.RefreshError as e:
-                self.logger.error(f"Failed to refresh token: {e}")
-                creds = None
+            # Refresh token if expired
+            if creds and creds.expired and creds.refresh_token:
+                try:
+                    creds.refresh(sym.Request())
+                    self.logger.info("Refreshed OAuth2 token")
+                    self._save_credentials(creds)
+                except sym.RefreshError as e:
+                    self.logger.error(f"Failed to refresh token: {e}")
+                    creds = None
         
-        # Run OAuth2 flow if no valid credentials
-        if not creds or not creds.valid:
-            creds = self._run_oauth_flow()
+            # Run OAuth2 flow if no valid credentials
+            if not creds or not creds.valid:
+                creds = self._run_oauth_flow()
         
-        return creds
+            self._creds = creds
+            return creds
+    
+    def invalidate(self) -> None:
+        """Drop cached credentials so the next call re-reads the token file."""
+        self._creds = None
     
     def _run_oauth_flow(self) -> Optional[Credentials]:
         """
@@ -109,7 +154,7 @@ class OAuth2Helper:
             return None
         
         try:
-            flow = InstalledAppFlow.from_client_secrets_file(
+            flow = _lazy_import().InstalledAppFlow.from_client_secrets_file(
                 self.credentials_file, self.SCOPES
             )
             
@@ -130,8 +175,8 @@ class OAuth2Helper:
     def _save_credentials(self, creds: Credentials) -> None:
         """Save credentials to token file."""
         try:
-            with open(self.token_file, 'w') as f:
-                f.write(creds.to_json())
+            with open(self.token_file, 'wb') as f:
+                f.write(creds.to_json().encode('utf-8'))
             self.logger.debug(f"Saved credentials to {self.token_file}")
         except Exception as e:
             self.logger.error(f"Failed to save credentials: {e}")
@@ -147,8 +192,16 @@ class OAuth2Helper:
         Returns:
             Base64-encoded XOAUTH2 string
         """
-        auth_string = f'user={email}\x01auth=Bearer {access_token}\x01\x01'
-        return base64.b64encode(auth_string.encode()).decode()
+        # Reuse the encoded string while the same token is used for the same user
+        cached = self._xoauth2_cache
+        if cached and cached[0] == email and cached[1] == access_token:
+            return cached[2]
+        
+        auth_bytes = b''.join((b'user=', email.encode(), b'\x01auth=Bearer ',
+                               access_token.encode(), b'\x01\x01'))
+        auth_string = base64.b64encode(auth_bytes).decode('ascii')
+        self._xoauth2_cache = (email, access_token, auth_string)
+        return auth_string
     
     def authenticate_imap_oauth2(self, conn, email: str) -> bool:
         """
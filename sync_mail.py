@@ -13,15 +13,32 @@ Date: 2025-10-19
 """
 
 import imaplib
-import email
 import json
+import atexit
 import logging
+import logging.handlers
+import queue
 import sys
 import argparse
-from typing import List, Dict, Optional, Tuple
+from typing import Iterator, List, Dict, Optional, Tuple, Union
 from datetime import datetime
 import os
-from email.header import decode_header
+import re
+import socket
+import ssl
+import time
+import weakref
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+
+from config_helper import load_config
+from uid_cache import DEFAULT_UID_CACHE_FILE, UIDCache
+
+# imaplib does not know COMPRESS (RFC 4978); register it so _simple_command accepts it
+imaplib.Commands.setdefault('COMPRESS', ('AUTH', 'SELECTED'))
+
 
 # Import OAuth2 helper (optional dependency)
 try:
@@ -47,31 +64,653 @@ def check_virtual_environment():
     return in_venv
 
 
+# IMAP host names of Gmail, in lowercase
+_GMAIL_HOSTS = frozenset({
+    'imap.gmail.com',
+    'imap.googlemail.com',
+})
+
+
+@lru_cache(maxsize=32)
 def is_gmail_server(server: str) -> bool:
     """Check if the server is a Gmail server."""
-    gmail_servers = [
-        'imap.gmail.com',
-        'imap.googlemail.com',
+    return server.lower() in _GMAIL_HOSTS
+
+
+# FETCH items for the headers used to verify a message; PEEK leaves \Seen untouched
+HEADER_FETCH_ITEMS = '(BODY.PEEK[HEADER.FIELDS (SUBJECT FROM MESSAGE-ID DATE)])'
+
+# Header FETCH items for Gmail sources when a trust_label is configured
+GMAIL_LABEL_FETCH_ITEMS = '(X-GM-LABELS BODY.PEEK[HEADER.FIELDS (SUBJECT FROM MESSAGE-ID DATE)])'
+
+# Number of messages whose headers are requested per FETCH command
+FETCH_BATCH_SIZE = 500
+
+# Number of header batches fetched ahead of the one being verified
+HEADER_PREFETCH_DEPTH = 4
+
+# FETCH items used to confirm which target messages matched a bulk Message-ID search
+TARGET_ID_FETCH_ITEMS = '(BODY.PEEK[HEADER.FIELDS (MESSAGE-ID)])'
+
+# Number of Message-IDs OR-ed together in one target SEARCH
+VERIFY_BATCH_SIZE = 50
+
+# Number of messages flagged per STORE when deleting from the source
+STORE_BATCH_SIZE = 1000
+
+# Idle time after which daemon mode sends NOOP so servers keep the session
+# open (RFC 9051 servers may drop sessions idle for 30 minutes)
+NOOP_IDLE_SECONDS = 1500
+
+
+# The header fields used for verification, with any folded continuation lines
+_HEADER_FIELDS_RE = re.compile(rb'^(subject|from|message-id|date)[ \t]*:[ \t]*(.*(?:\r?\n[ \t].*)*)',
+                               re.IGNORECASE | re.MULTILINE)
+_FOLD_RE = re.compile(rb'\r?\n(?=[ \t])')
+
+
+def _parse_headers(raw_header: bytes) -> Dict[str, str]:
+    """Extract Subject, From, Message-ID and Date from raw message headers.
+
+    A single regex pass replaces the email package's header parser, which
+    builds a full Message for the four fields needed. Folded values are
+    unfolded and raw 8-bit values are decoded as UTF-8 (Latin-1 otherwise);
+    encoded words are left for _decode_header.
+
+    Returns:
+        Dict keyed by lowercase field name; the first occurrence of a field wins
+    """
+    fields = {}
+    for match in _HEADER_FIELDS_RE.finditer(raw_header):
+        name = match.group(1).lower().decode('ascii')
+        if name in fields:
+            continue
+        value = _FOLD_RE.sub(b'', match.group(2)).strip()
+        try:
+            fields[name] = value.decode('utf-8')
+        except UnicodeDecodeError:
+            fields[name] = value.decode('latin-1')
+    return fields
+
+
+def _has_capability(conn: imaplib.IMAP4_SSL, name: str) -> bool:
+    """Check whether the server advertised a capability on this connection."""
+    capabilities = getattr(conn, 'capabilities', ())
+    return isinstance(capabilities, (tuple, list, set, frozenset)) and name in capabilities
+
+
+# UID data item in a FETCH response, e.g. b'12 (UID 4827 BODY[...] {342}'
+_UID_RE = re.compile(rb'\bUID (\d+)')
+
+
+def _fetched_uid(response_header: bytes) -> Optional[int]:
+    """Extract the UID from the start of a UID FETCH response item."""
+    match = _UID_RE.search(response_header)
+    return int(match.group(1)) if match else None
+
+
+def _iter_fetched(data: list) -> Iterator[Tuple[int, bytes, bytes]]:
+    """Walk a UID FETCH response, yielding (UID, response header, literal) per message.
+
+    imaplib returns each literal as a (b'<seq> (UID <uid> BODY[...] {n}',
+    b'<literal>') tuple followed by a b')' closer, which is skipped.
+    """
+    for item in data or ():
+        if type(item) is tuple and len(item) >= 2 and type(item[1]) is bytes:
+            uid = _fetched_uid(item[0])
+            if uid is not None:
+                yield uid, item[0], item[1]
+
+
+def _parse_uid_list(data: list) -> List[int]:
+    """Parse the UIDs of a UID SEARCH response, e.g. [b'4 9 12'] -> [4, 9, 12]."""
+    return [int(uid) for uid in data[0].split()] if data and data[0] else []
+
+
+# X-GM-LABELS data item in a FETCH response, and the labels (quoted or atoms) in it
+_GM_LABELS_RE = re.compile(rb'\bX-GM-LABELS \(([^)]*)\)')
+_GM_LABEL_RE = re.compile(rb'"((?:[^"\\]|\\.)*)"|([^\s"]+)')
+_QUOTED_ESCAPE_RE = re.compile(rb'\\(.)')
+
+
+def _fetched_labels(response_header: bytes) -> List[str]:
+    """Extract the Gmail labels from a FETCH response item that includes X-GM-LABELS."""
+    match = _GM_LABELS_RE.search(response_header)
+    if not match:
+        return []
+    return [
+        (_QUOTED_ESCAPE_RE.sub(rb'\1', quoted) if atom == b'' else atom).decode('utf-8', 'replace')
+        for quoted, atom in _GM_LABEL_RE.findall(match.group(1))
     ]
-    return server.lower() in gmail_servers
+
+
+# Message-ID header in a HEADER.FIELDS literal, allowing a folded value
+_MESSAGE_ID_HEADER_RE = re.compile(rb'(?im)^Message-ID:[ \t]*(?:\r?\n[ \t]+)?(\S+)')
+
+# Gmail search term matching messages by their age, which grows without
+# any change the UID cache could notice
+_GMAIL_AGE_TERM_RE = re.compile(r'(?<![\w-])older_than:', re.IGNORECASE)
+
+# Characters that cannot appear in a bare Gmail rfc822msgid: term
+_GMAIL_QUERY_SPECIAL_RE = re.compile(r'[\s{}()"]')
+
+
+def _get_uidvalidity(conn: imaplib.IMAP4_SSL) -> Optional[int]:
+    """Read the UIDVALIDITY reported by the last SELECT on this connection."""
+    try:
+        status, data = conn.response('UIDVALIDITY')
+        return int(data[-1])
+    except Exception:
+        return None
+
+
+def _tune_socket(conn: imaplib.IMAP4_SSL):
+    """Set the socket options that suit IMAP's exchange of small commands and replies.
+
+    TCP_NODELAY stops Nagle's algorithm from holding back short commands, and
+    keepalive makes dropped connections noticeable between sync cycles.
+    """
+    sock = getattr(conn, 'sock', None)
+    if isinstance(sock, socket.socket):
+        for level, option in ((socket.IPPROTO_TCP, socket.TCP_NODELAY), (socket.SOL_SOCKET, socket.SO_KEEPALIVE)):
+            try:
+                sock.setsockopt(level, option, 1)
+            except OSError:
+                pass
+
+
+class _SessionReusingContext(ssl.SSLContext):
+    """SSL context that resumes the last TLS session seen for each server.
+
+    imaplib wraps its socket without a session argument, so the saved
+    session is supplied here; reconnects then skip the full handshake.
+    """
+
+    def __new__(cls, protocol: int = ssl.PROTOCOL_TLS_CLIENT):
+        # SSLContext applies the protocol in __new__, not __init__
+        return super().__new__(cls, protocol)
+
+    def __init__(self, protocol: int = ssl.PROTOCOL_TLS_CLIENT):
+        super().__init__()
+        self.sessions: Dict[str, ssl.SSLSession] = {}
+
+    def wrap_socket(self, sock, *args, **kwargs):
+        if kwargs.get('session') is None:
+            kwargs['session'] = self.sessions.get(kwargs.get('server_hostname'))
+        return super().wrap_socket(sock, *args, **kwargs)
+
+    def save_session(self, server: str, sock):
+        """Remember the TLS session of a connected socket for later reconnects."""
+        session = getattr(sock, 'session', None) if isinstance(sock, ssl.SSLSocket) else None
+        if session is not None:
+            self.sessions[server] = session
+
+
+@lru_cache(maxsize=None)
+def _get_ssl_context() -> _SessionReusingContext:
+    """Get the SSL context shared by all connections, created on first use.
+
+    Certificates are not verified, like imaplib's default context, so
+    servers with self-signed certificates keep working.
+    """
+    context = _SessionReusingContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    context.options |= ssl.OP_NO_COMPRESSION
+    return context
+
+
+def _get_highestmodseq(conn: imaplib.IMAP4_SSL) -> Optional[int]:
+    """Read the HIGHESTMODSEQ reported by the last SELECT (RFC 7162 CONDSTORE)."""
+    try:
+        status, data = conn.response('HIGHESTMODSEQ')
+        return int(data[-1])
+    except Exception:
+        return None
+
+
+# LIST response, e.g. b'(\\HasNoChildren \\All) "/" "[Gmail]/All Mail"'
+_LIST_RE = re.compile(rb'\((?P<flags>[^)]*)\) (?P<delimiter>"[^"]*"|NIL) (?P<name>.+)')
+
+
+def _select(conn: imaplib.IMAP4_SSL, folder: str, force: bool = False) -> Tuple[str, list]:
+    """SELECT a folder unless it is already selected on this connection.
+
+    The last successful SELECT is remembered on the connection, so repeated
+    verification lookups in the same folder cost no round-trip. Use force
+    when fresh SELECT responses (e.g. UIDVALIDITY) are needed.
+
+    Returns:
+        The (status, data) of the SELECT, cached if it was skipped
+    """
+    selected = getattr(conn, '_selected', None)
+    if not force and isinstance(selected, tuple) and selected[0] == folder:
+        return selected[1]
+
+    # A failed SELECT leaves no folder selected
+    conn._selected = None
+    result = conn.select(folder)
+    if result[0] == 'OK':
+        conn._selected = (folder, result)
+    return result
+
+
+def _find_all_mail_folder(conn: imaplib.IMAP4_SSL) -> str:
+    """Find the folder marked with the \\All special-use attribute (RFC 6154).
+
+    On servers with SPECIAL-USE only special-use folders are listed, rather
+    than every folder (for Gmail, every label).
+
+    Returns:
+        The folder name as listed (quoted when it contains spaces), or '' if none
+    """
+    try:
+        if _has_capability(conn, 'SPECIAL-USE'):
+            status, data = conn._simple_command('LIST', '(SPECIAL-USE)', '""', '*')
+            status, data = conn._untagged_response(status, data, 'LIST')
+        else:
+            status, data = conn.list()
+    except Exception:
+        return ''
+    if status != 'OK':
+        return ''
+    for line in data or []:
+        if not isinstance(line, bytes):
+            continue
+        match = _LIST_RE.match(line)
+        if match and b'\\all' in match.group('flags').lower().split():
+            return match.group('name').decode('ascii', 'replace')
+    return ''
+
+
+def _refresh_capabilities(conn: imaplib.IMAP4_SSL):
+    """Update conn.capabilities after login.
+
+    imaplib only records the pre-authentication capabilities. Most servers
+    send the new list in the login response; otherwise CAPABILITY is asked.
+    """
+    try:
+        status, data = conn.response('CAPABILITY')
+        if not data or data[-1] is None:
+            status, data = conn.capability()
+        conn.capabilities = tuple(data[-1].upper().decode('ascii').split())
+    except Exception:
+        pass
+
+
+class _DeflateReader:
+    """File-like reader inflating the raw DEFLATE stream of a compressed IMAP connection."""
+
+    def __init__(self, raw_file):
+        # Read through the existing buffered file, since it may already hold
+        # compressed bytes that arrived right after the COMPRESS response
+        self._raw_file = raw_file
+        self._inflater = zlib.decompressobj(-15)
+        self._buffer = bytearray()
+
+    def _fill(self) -> bool:
+        """Inflate the next chunk from the socket; False at end of stream."""
+        chunk = self._raw_file.read1(65536)
+        if not chunk:
+            return False
+        self._buffer += self._inflater.decompress(chunk)
+        return True
+
+    def read(self, size: int) -> bytes:
+        """Read exactly size bytes, or fewer at end of stream."""
+        while len(self._buffer) < size and self._fill():
+            pass
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def readline(self, limit: int = -1) -> bytes:
+        """Read up to and including the next newline (at most limit bytes)."""
+        while True:
+            end = self._buffer.find(b'\n') + 1
+            if end:
+                break
+            if 0 <= limit <= len(self._buffer) or not self._fill():
+                end = len(self._buffer)
+                break
+        if 0 <= limit < end:
+            end = limit
+        data = bytes(self._buffer[:end])
+        del self._buffer[:end]
+        return data
+
+    def close(self):
+        self._raw_file.close()
+
+
+def _enable_compression(conn: imaplib.IMAP4_SSL) -> bool:
+    """Turn on COMPRESS=DEFLATE (RFC 4978) if the server supports it.
+
+    All later reads go through an inflating file wrapper and all writes are
+    deflated with a sync flush per command.
+
+    Returns:
+        True if compression is active
+    """
+    if not _has_capability(conn, 'COMPRESS=DEFLATE'):
+        return False
+    status, data = conn._simple_command('COMPRESS', 'DEFLATE')
+    if status != 'OK':
+        return False
+
+    deflater = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    sock = conn.sock
+
+    def send(data: bytes):
+        sock.sendall(deflater.compress(data) + deflater.flush(zlib.Z_SYNC_FLUSH))
+
+    conn.file = _DeflateReader(conn.file)
+    conn.send = send
+    return True
+
+
+def _expand_sequence_set(sequence_set: bytes) -> List[int]:
+    """Expand an IMAP sequence set such as b'2:4,9' into individual IDs."""
+    ids = []
+    for part in sequence_set.split(b','):
+        if b':' in part:
+            first, last = part.split(b':', 1)
+            low, high = sorted((int(first), int(last)))
+            ids.extend(range(low, high + 1))
+        elif part:
+            ids.append(int(part))
+    return ids
+
+
+def _compact_uid_set(message_ids) -> str:
+    """Coalesce message IDs into a compact IMAP sequence set, e.g. '1,3,7:12'."""
+    numbers = sorted({int(message_id) for message_id in message_ids})
+    ranges = []
+    for number in numbers:
+        if ranges and number == ranges[-1][1] + 1:
+            ranges[-1][1] = number
+        else:
+            ranges.append([number, number])
+    return ','.join(str(low) if low == high else f"{low}:{high}" for low, high in ranges)
+
+
+def _parse_esearch_all(data: List[bytes]) -> List[int]:
+    """Extract the message IDs from the ALL result of ESEARCH responses (RFC 4731)."""
+    ids = []
+    for line in data or []:
+        if not isinstance(line, bytes):
+            continue
+        tokens = line.split()
+        for index, token in enumerate(tokens[:-1]):
+            if token.upper() == b'ALL':
+                ids.extend(_expand_sequence_set(tokens[index + 1]))
+    return ids
+
+
+def _imap_quote(value) -> str:
+    """Quote a value as an IMAP quoted string, escaping backslashes and quotes.
+
+    Quoted strings cannot hold line breaks, so they are replaced by spaces.
+    """
+    text = str(value).replace('\r', ' ').replace('\n', ' ')
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+# An IMAP quoted string, as produced by _imap_quote
+_QUOTED_RE = re.compile(r'"((?:[^"\\]|\\.)*)"')
+_QUOTED_ESCAPE_STR_RE = re.compile(r'\\(.)')
+
+
+def _search_arguments(conn: imaplib.IMAP4_SSL, args: Tuple[str, ...]) -> Tuple[Tuple, Optional[bytes]]:
+    """Prepare SEARCH arguments, sending non-ASCII quoted values as literals.
+
+    Quoted strings may only hold ASCII (RFC 3501), so searches with other
+    characters are sent with CHARSET UTF-8 and those values as literals. With
+    LITERAL+ (RFC 7888) they are inlined as non-synchronizing literals.
+    Otherwise imaplib can send only one literal, at the end of the command,
+    so that value's key is moved last; search keys are ANDed, so the order
+    does not matter.
+
+    Args:
+        conn: IMAP connection the search is sent on
+        args: Search program arguments, e.g. ('SUBJECT "Report" SINCE "01-Jan-2024"',)
+
+    Returns:
+        Tuple of (arguments for conn.uid('SEARCH', ...), literal to assign to
+        conn.literal before sending, or None)
+
+    Raises:
+        Exception: If several values need literals and the server lacks LITERAL+
+    """
+    # utf8_enabled is set once ENABLE UTF8=ACCEPT succeeded (RFC 6855)
+    if all(arg.isascii() for arg in args) or getattr(conn, 'utf8_enabled', False) is True:
+        return args, None
+    return _encode_search_arguments(tuple(args), _has_capability(conn, 'LITERAL+'))
+
+
+@lru_cache(32)
+def _encode_search_arguments(args: Tuple[str, ...], literal_plus: bool) -> Tuple[Tuple, Optional[bytes]]:
+    """Encode a non-ASCII search program for _search_arguments.
+
+    The configured search is the same every cycle in daemon mode, so its
+    encoding is remembered rather than rebuilt.
+    """
+    program = ' '.join(args)
+    matches = [match for match in _QUOTED_RE.finditer(program) if not match.group(0).isascii()]
+
+    if literal_plus:
+        parts, position = [b'CHARSET UTF-8 '], 0
+        for match in matches:
+            value = _QUOTED_ESCAPE_STR_RE.sub(r'\1', match.group(1)).encode('utf-8')
+            parts.append(program[position:match.start()].encode('ascii', 'replace'))
+            parts.append(b'{%d+}\r\n%s' % (len(value), value))
+            position = match.end()
+        parts.append(program[position:].encode('ascii', 'replace'))
+        return (b''.join(parts),), None
+
+    if len(matches) != 1:
+        raise Exception("Searching for several non-ASCII values requires a server with LITERAL+")
+
+    match = matches[0]
+    head, _, key = program[:match.start()].rstrip().rpartition(' ')
+    rest = ' '.join(part for part in (head, program[match.end():].strip(), key) if part)
+    value = _QUOTED_ESCAPE_STR_RE.sub(r'\1', match.group(1)).encode('utf-8')
+    return ('CHARSET', 'UTF-8', rest.encode('ascii', 'replace')), value
+
+
+def _imap_number(value) -> str:
+    """Format a value as an IMAP number, e.g. for LARGER and SMALLER."""
+    return str(int(value))
+
+
+# Search criteria keys mapped to their standard IMAP SEARCH keys and the
+# function formatting their values
+_IMAP_TERMS = {
+    'subject': ('SUBJECT', _imap_quote),
+    'from': ('FROM', _imap_quote),
+    'date_after': ('SINCE', _imap_quote),
+    'to': ('TO', _imap_quote),
+    'body': ('BODY', _imap_quote),
+    'before_date': ('BEFORE', _imap_quote),
+    'larger': ('LARGER', _imap_number),
+    'smaller': ('SMALLER', _imap_number),
+}
+
+
+def build_imap_search(criteria: Dict) -> str:
+    """Build a standard IMAP search string from search criteria.
+
+    Criteria are walked once in their own order; keys without an IMAP
+    equivalent (such as gmail_query) and empty values are ignored. Text
+    values are quoted with _imap_quote, so quotes and backslashes in them
+    are escaped; sizes (larger, smaller) are given in bytes.
+    """
+    search_terms = [f"{term[0]} {term[1](value)}" for key, value in criteria.items()
+                    if value and (term := _IMAP_TERMS.get(key))]
+    # Default search if no criteria; a single criterion needs no join
+    if not search_terms:
+        return 'ALL'
+    if len(search_terms) == 1:
+        return search_terms[0]
+    return ' '.join(search_terms)
+
+
+def _decode_header_value(header_value) -> str:
+    """Decode email header value with improved Unicode handling."""
+    if not header_value:
+        return ''
+
+    try:
+        from email.header import decode_header  # imported on first use to keep start-up fast
+        decoded_parts = decode_header(header_value)
+        decoded_string = ''
+
+        for part, encoding in decoded_parts:
+            if isinstance(part, bytes):
+                # Try specific encoding first, then fallback to utf-8, then latin-1
+                try:
+                    decoded_string += part.decode(encoding or 'utf-8')
+                except (UnicodeDecodeError, LookupError):
+                    try:
+                        decoded_string += part.decode('utf-8')
+                    except UnicodeDecodeError:
+                        decoded_string += part.decode('latin-1', errors='replace')
+            else:
+                decoded_string += str(part)
+
+        return decoded_string
+    except Exception as e:
+        # Return sanitized version if all else fails
+        try:
+            return str(header_value).encode('ascii', errors='replace').decode('ascii')
+        except Exception:
+            return f"[Encoding Error: {str(e)}]"
+
+
+# Subjects and senders repeat across a mailbox, so decoded strings are memoized
+_decode_header_str = lru_cache(maxsize=8192)(_decode_header_value)
+
+
+def _decode_header(header_value) -> str:
+    """Decode an email header value, memoizing results for plain strings.
+
+    Strings without an encoded word ("=?") are returned unchanged, as
+    decode_header would. Other values, such as email.header.Header objects,
+    are unhashable and are decoded without the cache.
+    """
+    if isinstance(header_value, str):
+        if '=?' not in header_value:
+            return header_value
+        return _decode_header_str(header_value)
+    return _decode_header_value(header_value)
+
+
+# ASCII control characters and quotes, removed by _safe_search_string
+_UNSAFE_SEARCH_BYTES = bytes(range(32)) + b'\x7f"'
+_SPACE_RUN_RE = re.compile(rb' {2,}')
+_HAS_ALPHA = re.compile(rb'[A-Za-z]').search
+
+
+@lru_cache(maxsize=8192)
+def _safe_search_string(text: str) -> str:
+    """Create a safe ASCII string for IMAP search commands."""
+    if not text:
+        return ''
+    try:
+        # Extract printable ASCII only, skipping non-ASCII to avoid IMAP errors,
+        # drop quotes that could break IMAP search and collapse spaces (all done in C)
+        ascii_bytes = text.encode('ascii', 'ignore').translate(None, _UNSAFE_SEARCH_BYTES)
+        cleaned = _SPACE_RUN_RE.sub(b' ', ascii_bytes).strip(b' ')
+        # Only return if we have meaningful text
+        if len(cleaned) >= 3:
+            # For email addresses, preserve them as-is; other text needs some letters
+            if (b'@' in cleaned and b'.' in cleaned) or _HAS_ALPHA(cleaned):
+                return cleaned.decode('ascii')
+        return ''
+    except Exception:
+        return ''
+
+
+# Background writer for log records, started by IMAPSync._setup_logging
+_log_listener = None
+
+
+def _flush_logs():
+    """Write out every queued log record before returning."""
+    if _log_listener is not None:
+        # The listener marks each record done once its handlers wrote it
+        _log_listener.queue.join()
+
+
+def _stop_log_listener():
+    """Write out queued records and stop the listener; safe to call twice."""
+    global _log_listener
+    listener, _log_listener = _log_listener, None
+    if listener is not None:
+        listener.stop()
 
 
 class IMAPSync:
     """Main class for IMAP email synchronization."""
 
-    def __init__(self, config_path: str = "config.json"):
-        """Initialize the IMAP sync with configuration."""
-        self.config = self._load_config(config_path)
+    def __init__(self, config_path: Union[str, Dict] = "config.json"):
+        """Initialize the IMAP sync with configuration.
+
+        Args:
+            config_path: Path of the JSON configuration file, or an already
+                loaded configuration dictionary
+        """
+        self.config = config_path if isinstance(config_path, dict) else self._load_config(config_path)
         self._setup_logging()
         self.source_conn = None
         self.target_conn = None
+        # Additional target connections used when "target_parallelism" > 1
+        self._extra_target_conns: List[imaplib.IMAP4_SSL] = []
+        # Set while used as a context manager, which then owns the connections
+        self._managed = False
+        self._oauth_helpers: Dict[Tuple[str, str], 'OAuth2Helper'] = {}
+        # Connection whose last search result was saved as "$" (RFC 5182 SEARCHRES)
+        self._saved_search_conn = None
+        self.uid_cache = self._init_uid_cache()
+        # (cache key, UIDVALIDITY, last seen UID, pending UIDs) of the last cached search
+        self._uid_cache_state = None
+        # time.monotonic() each connection was last known to be used, so idle
+        # ones (including the extra target connections) are kept alive with NOOP
+        self._last_activity: 'weakref.WeakKeyDictionary[imaplib.IMAP4_SSL, float]' = weakref.WeakKeyDictionary()
+        # The configured criteria never change, so their search string is built once
+        self._search_criteria = self.config.get('search_criteria', {})
+        self._search_string = build_imap_search(self._search_criteria)
+        # Gmail label proving a source message is already in the target
+        self._trust_label = self.config.get('trust_label') or ''
+        if self._trust_label and is_gmail_server(self.config.get('source_mailbox', {}).get('server', '')):
+            self._header_fetch_items = GMAIL_LABEL_FETCH_ITEMS
+        else:
+            self._header_fetch_items = HEADER_FETCH_ITEMS
+
+    def __enter__(self) -> 'IMAPSync':
+        """Keep connections open across run_sync calls until the block exits."""
+        self._managed = True
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Close the connections left open by run_sync."""
+        self._managed = False
+        self.close_connections()
+
+    def _init_uid_cache(self) -> Optional[UIDCache]:
+        """Create the UID cache if enabled with the 'uid_cache' config option.
+
+        The option is either true (use the default cache file) or a file path.
+        """
+        setting = self.config.get('uid_cache', False)
+        if not setting:
+            return None
+        return UIDCache(setting if isinstance(setting, str) else DEFAULT_UID_CACHE_FILE)
 
     def _load_config(self, config_path: str) -> Dict:
-        """Load configuration from JSON file."""
+        """Load configuration from JSON file (parsed once while the file is unchanged)."""
         try:
-            with open(config_path, 'r') as f:
-                config = json.load(f)
-            return config
+            return load_config(config_path)
         except FileNotFoundError:
             print(f"Configuration file {config_path} not found.")
             print("Please copy config.example.json to config.json and configure it.")
@@ -81,19 +720,53 @@ class IMAPSync:
             sys.exit(1)
 
     def _setup_logging(self):
-        """Setup logging configuration."""
+        """Setup logging configuration.
+
+        Records go through a QueueHandler and are written to the log file and
+        the console by a background QueueListener, so disk and terminal I/O
+        do not stall the IMAP loop. run_sync drains the queue with
+        _flush_logs before returning, so log lines still come out before
+        anything the caller prints.
+        """
         log_level = getattr(logging, self.config.get('log_level', 'INFO').upper())
 
-        logging.basicConfig(
-            level=log_level,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler('sync_mail.log'),
-                logging.StreamHandler(sys.stdout)
-            ]
-        )
+        # Like basicConfig, only configure logging once
+        if not logging.getLogger().handlers:
+            formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+            file_handler = logging.FileHandler('sync_mail.log')
+            file_handler.setFormatter(formatter)
+            stream_handler = logging.StreamHandler(sys.stdout)
+            stream_handler.setFormatter(formatter)
+
+            # queue.Queue rather than SimpleQueue, so _flush_logs can join it
+            log_queue = queue.Queue()
+            queue_handler = logging.handlers.QueueHandler(log_queue)
+            # The listener's handlers apply the real format
+            queue_handler.setFormatter(logging.Formatter('%(message)s'))
+            global _log_listener
+            _log_listener = logging.handlers.QueueListener(log_queue, file_handler, stream_handler)
+            _log_listener.start()
+            # Write out queued records on exit
+            atexit.register(_stop_log_listener)
+
+            logging.basicConfig(
+                level=log_level,
+                handlers=[
+                    queue_handler
+                ]
+            )
         self.logger = logging.getLogger(__name__)
 
+    def _get_oauth_helper(self, mailbox_config: Dict) -> 'OAuth2Helper':
+        """Return the OAuth2 helper for a mailbox, reusing it across connections."""
+        key = (mailbox_config.get('credentials_file', 'credentials.json'),
+               mailbox_config.get('token_file', 'token.json'))
+        helper = self._oauth_helpers.get(key)
+        if helper is None:
+            helper = OAuth2Helper(credentials_file=key[0], token_file=key[1])
+            self._oauth_helpers[key] = helper
+        return helper
+
     def connect_imap(self, mailbox_config: Dict) -> imaplib.IMAP4_SSL:
         """Connect to an IMAP server with support for both password and OAuth2 authentication."""
         try:
@@ -101,10 +774,12 @@ class IMAPSync:
             port = mailbox_config.get('port', 993)
             username = mailbox_config['username']
 
-            self.logger.info(f"Connecting to {server}:{port}")
+            self.logger.info("Connecting to %s:%s", server, port)
 
             # Create IMAP connection
-            conn = imaplib.IMAP4_SSL(server, port)
+            ssl_context = _get_ssl_context()
+            conn = imaplib.IMAP4_SSL(server, port, ssl_context=ssl_context)
+            _tune_socket(conn)
 
             # Determine authentication method
             auth_method = mailbox_config.get('auth_method', 'password')
@@ -117,10 +792,7 @@ class IMAPSync:
                         "Install dependencies: pip install google-auth google-auth-oauthlib"
                     )
 
-                oauth_helper = OAuth2Helper(
-                    credentials_file=mailbox_config.get('credentials_file', 'credentials.json'),
-                    token_file=mailbox_config.get('token_file', 'token.json')
-                )
+                oauth_helper = self._get_oauth_helper(mailbox_config)
 
                 if not oauth_helper.authenticate_imap_oauth2(conn, username):
                     raise Exception("OAuth2 authentication failed")
@@ -130,126 +802,241 @@ class IMAPSync:
                 password = mailbox_config['password']
                 conn.login(username, password)
 
-            self.logger.info(f"Successfully connected to {server} as {username} using {auth_method}")
+            # The session (and TLS 1.3 ticket) is known once the login reply was read
+            ssl_context.save_session(server, conn.sock)
+
+            # Servers usually advertise extensions such as COMPRESS only after login
+            _refresh_capabilities(conn)
+
+            # Compress traffic after authentication, unless disabled for this mailbox
+            if mailbox_config.get('compress', True):
+                try:
+                    if _enable_compression(conn):
+                        self.logger.debug("COMPRESS=DEFLATE enabled for %s", server)
+                except imaplib.IMAP4.error as e:
+                    self.logger.debug("COMPRESS=DEFLATE failed for %s: %s", server, e)
+
+            # Look up All Mail once instead of probing folder names per search
+            if is_gmail_server(server):
+                all_mail = self._all_mail_folder(conn)
+                self.logger.debug("Gmail All Mail folder: %s", all_mail or 'not found')
+
+            # Have the server report HIGHESTMODSEQ on SELECT (RFC 7162)
+            if _has_capability(conn, 'CONDSTORE'):
+                try:
+                    conn.enable('CONDSTORE')
+                except imaplib.IMAP4.error as e:
+                    self.logger.debug("ENABLE CONDSTORE failed: %s", e)
+
+            self.logger.info("Successfully connected to %s as %s using %s", server, username, auth_method)
+            self._last_activity[conn] = time.monotonic()
             return conn
 
         except imaplib.IMAP4.error as e:
-            self.logger.error(f"IMAP connection error: {e}")
+            self.logger.error("IMAP connection error: %s", e)
             raise
         except Exception as e:
-            self.logger.error(f"Unexpected error connecting to IMAP: {e}")
+            self.logger.error("Unexpected error connecting to IMAP: %s", e)
             raise
 
-    def search_emails(self, conn: imaplib.IMAP4_SSL, folder: str, criteria: Dict, server: str = '') -> List[bytes]:
-        """Search for emails matching criteria using Gmail or standard IMAP search."""
+    def search_emails(self, conn: imaplib.IMAP4_SSL, folder: str, criteria: Dict, server: str = '',
+                      cache_key: str = '') -> List[int]:
+        """Search for emails matching criteria using Gmail or standard IMAP search.
+
+        Args:
+            conn: IMAP connection
+            folder: Folder to search
+            criteria: Search criteria
+            server: Server name, used to detect Gmail
+            cache_key: UIDCache key; when given and the UID cache is enabled,
+                only UIDs not yet processed are searched
+
+        Returns:
+            List of matching message UIDs
+        """
+        # "$" only stands for this search's result if the SAVE search below
+        # sets it again, whichever branch runs
+        self._saved_search_conn = None
         try:
             # Check if this is a Gmail server and if Gmail search is provided
             is_gmail = is_gmail_server(server)
+            if cache_key and is_gmail and _GMAIL_AGE_TERM_RE.search(criteria.get('gmail_query', '')):
+                # Old messages start matching as they age, so the whole folder
+                # is searched every run
+                self.logger.debug("UID cache not used: gmail_query matches by message age")
+                cache_key = ''
+            # The UID cache reads UIDVALIDITY from a fresh SELECT; otherwise a
+            # folder still selected from the last cycle can be searched as is
+            fresh_select = bool(self.uid_cache and cache_key)
 
             # For Gmail with X-GM-RAW search, use [Gmail]/All Mail for comprehensive search
             # For standard IMAP or Gmail fallback, use the specified folder
             if is_gmail and 'gmail_query' in criteria:
-                # Try different Gmail folder variations for All Mail
-                gmail_folders = [
-                    '"[Gmail]/All Mail"',    # Quoted version
-                    '[Gmail]/All Mail',      # Original
-                    '"All Mail"',           # Simple quoted
-                    'All Mail'              # Simple
-                ]
-
+                # All Mail is discovered once per connection, whatever its localized name
+                all_mail = self._all_mail_folder(conn)
                 selected_folder = None
-                for gmail_folder in gmail_folders:
+                if all_mail:
                     try:
-                        status, messages = conn.select(gmail_folder)
+                        status, messages = _select(conn, all_mail, force=fresh_select)
                         if status == 'OK':
-                            selected_folder = gmail_folder
-                            self.logger.info(f"Using Gmail folder '{gmail_folder}' for comprehensive search")
-                            break
+                            selected_folder = all_mail
+                            self.logger.info("Using Gmail folder '%s' for comprehensive search", all_mail)
                     except Exception:
-                        continue
+                        pass
 
                 if not selected_folder:
                     # Fallback to specified folder if All Mail variations not available
-                    self.logger.info(f"Gmail All Mail folder not available, using specified folder {folder}")
-                    status, messages = conn.select(folder)
+                    self.logger.info("Gmail All Mail folder not available, using specified folder %s", folder)
+                    status, messages = _select(conn, folder, force=fresh_select)
                     if status != 'OK':
                         raise Exception(f"Failed to select folder {folder}")
             else:
                 # Standard folder selection for non-Gmail or standard IMAP search
-                status, messages = conn.select(folder)
+                status, messages = _select(conn, folder, force=fresh_select)
                 if status != 'OK':
                     raise Exception(f"Failed to select folder {folder}")
 
+            # Restrict the search to messages not processed by an earlier run
+            cache_terms = self._cached_search_terms(conn, cache_key)
+            uid_terms = (cache_terms,) if cache_terms else ()
+
             if is_gmail and 'gmail_query' in criteria:
                 # Use Gmail's native search syntax (X-GM-RAW)
                 gmail_query = criteria['gmail_query']
-                self.logger.info(f"Using Gmail search: {gmail_query}")
+                self.logger.info("Using Gmail search: %s", gmail_query)
 
                 try:
                     # Gmail supports X-GM-RAW for native Gmail search syntax
-                    status, message_ids = conn.search(None, 'X-GM-RAW', f'"{gmail_query}"')
+                    search_args, conn.literal = _search_arguments(conn, (*uid_terms, 'X-GM-RAW', _imap_quote(gmail_query)))
+                    status, message_ids = conn.uid('SEARCH', *search_args)
                     if status == 'OK':
-                        message_list = message_ids[0].split() if message_ids[0] else []
-                        self.logger.info(f"Found {len(message_list)} messages using Gmail search")
+                        message_list = self._filter_cached_uids(_parse_uid_list(message_ids))
+                        self.logger.info("Found %s messages using Gmail search", len(message_list))
                         return message_list
                     else:
-                        self.logger.warning(f"Gmail search failed: {status}, falling back to standard search")
+                        self.logger.warning("Gmail search failed: %s, falling back to standard search", status)
                 except Exception as e:
-                    self.logger.warning(f"Gmail search error: {e}, falling back to standard search")
+                    self.logger.warning("Gmail search error: %s, falling back to standard search", e)
 
             # Standard IMAP search (fallback or non-Gmail servers)
-            search_terms = []
+            if criteria is self._search_criteria:
+                search_string = self._search_string
+            else:
+                search_string = build_imap_search(criteria)
+            if cache_terms:
+                search_string = f"{cache_terms} {search_string}"
+            search_type = "Gmail fallback" if is_gmail else "Standard IMAP"
+            self.logger.info("Using %s search: %s", search_type, search_string)
+
+            # Perform search
+            search_args, conn.literal = _search_arguments(conn, (search_string,))
+            if _has_capability(conn, 'SEARCHRES'):
+                # Also save the result on the server so it can be referenced as "$"
+                status, message_ids = conn._simple_command('UID', 'SEARCH', 'RETURN', '(SAVE ALL)', *search_args)
+                if status != 'OK':
+                    raise Exception(f"Search failed: {status}")
+                status, message_ids = conn._untagged_response(status, message_ids, 'ESEARCH')
+                found_list = _parse_esearch_all(message_ids)
+                message_list = self._filter_cached_uids(found_list)
+                # "$" is only usable if it holds exactly the returned messages
+                if len(message_list) == len(found_list):
+                    self._saved_search_conn = conn
+            else:
+                status, message_ids = conn.uid('SEARCH', *search_args)
+                if status != 'OK':
+                    raise Exception(f"Search failed: {status}")
 
-            if 'subject' in criteria:
-                search_terms.append(f'SUBJECT "{criteria["subject"]}"')
+                message_list = self._filter_cached_uids(_parse_uid_list(message_ids))
+            self.logger.info("Found %s messages", len(message_list))
 
-            if 'from' in criteria:
-                search_terms.append(f'FROM "{criteria["from"]}"')
+            return message_list
 
-            if 'date_after' in criteria:
-                search_terms.append(f'SINCE "{criteria["date_after"]}"')
+        except Exception as e:
+            self.logger.error("Error searching emails: %s", e)
+            raise
 
-            if 'to' in criteria:
-                search_terms.append(f'TO "{criteria["to"]}"')
+    def _cached_search_terms(self, conn: imaplib.IMAP4_SSL, cache_key: str) -> str:
+        """Get the search terms limiting a cached folder to messages left to check.
 
-            if 'body' in criteria:
-                search_terms.append(f'BODY "{criteria["body"]}"')
+        Must be called right after the folder is selected. Remembers the cache
+        state so _record_uid_cache can update it after the sync. On CONDSTORE
+        servers (RFC 7162) the search covers pending UIDs plus every message
+        changed since the recorded HIGHESTMODSEQ, which also catches older
+        messages that only now match (e.g. a label was added). Otherwise it
+        covers pending UIDs plus UIDs above the last one seen.
 
-            if 'before_date' in criteria:
-                search_terms.append(f'BEFORE "{criteria["before_date"]}"')
+        Returns:
+            Search terms to prepend to the criteria, or '' to search everything
+        """
+        self._uid_cache_state = None
+        if not self.uid_cache or not cache_key:
+            return ''
 
-            # Default search if no criteria
-            if not search_terms:
-                search_terms = ['ALL']
+        uidvalidity = _get_uidvalidity(conn)
+        if uidvalidity is None:
+            return ''
 
-            search_string = ' '.join(search_terms)
-            search_type = "Gmail fallback" if is_gmail else "Standard IMAP"
-            self.logger.info(f"Using {search_type} search: {search_string}")
+        modseq = _get_highestmodseq(conn) if _has_capability(conn, 'CONDSTORE') else None
+        cached = self.uid_cache.get(cache_key, uidvalidity)
+        last_uid, pending, last_modseq = cached if cached else (0, [], 0)
+        use_modseq = bool(cached and modseq is not None and last_modseq)
+        self._uid_cache_state = {
+            'key': cache_key,
+            'uidvalidity': uidvalidity,
+            'last_uid': last_uid,
+            'pending': set(pending),
+            'modseq': modseq or 0,
+            'filter': bool(cached) and not use_modseq,
+        }
+        if not cached:
+            return ''
 
-            # Perform search
-            status, message_ids = conn.search(None, search_string)
-            if status != 'OK':
-                raise Exception(f"Search failed: {status}")
+        if use_modseq:
+            self.logger.info("UID cache: searching %s pending messages and changes after MODSEQ %s",
+                             len(pending), last_modseq)
+            changed = f"MODSEQ {last_modseq + 1}"
+            return f"OR UID {_compact_uid_set(pending)} {changed}" if pending else changed
+
+        uid_set = f"{last_uid + 1}:*"
+        if pending:
+            uid_set = f"{_compact_uid_set(pending)},{uid_set}"
+        self.logger.info("UID cache: searching %s pending messages and UIDs after %s", len(pending), last_uid)
+        return f"UID {uid_set}"
 
-            message_list = message_ids[0].split() if message_ids[0] else []
-            self.logger.info(f"Found {len(message_list)} messages")
+    def _filter_cached_uids(self, message_list: List[int]) -> List[int]:
+        """Drop UIDs already processed by an earlier run.
 
+        A UID range "n:*" also matches the highest UID when n is beyond it,
+        so the search result is filtered against the cache again.
+        """
+        state = self._uid_cache_state
+        if not state or not state['filter']:
             return message_list
+        return [uid for uid in message_list if uid > state['last_uid'] or uid in state['pending']]
+
+    def _record_uid_cache(self, message_ids: List[int], removed_ids: List[int]):
+        """Store the processed UIDs for the folder searched last, keeping those left in place."""
+        state = self._uid_cache_state
+        if not state:
+            return
+        found = set(message_ids)
+        pending = found.difference(removed_ids)
+        self.uid_cache.update(state['key'], state['uidvalidity'], max(found | {state['last_uid']}),
+                              list(pending), state['modseq'])
+        try:
+            self.uid_cache.save()
+        except OSError as e:
+            self.logger.warning("Could not save UID cache: %s", e)
 
-        except Exception as e:
-            self.logger.error(f"Error searching emails: {e}")
-            raise
+    def get_message_info(self, conn: imaplib.IMAP4_SSL, message_id: int) -> Dict:
+        """Get message information for verification.
 
-    def get_message_info(self, conn: imaplib.IMAP4_SSL, message_id: bytes) -> Dict:
-        """Get message information for verification."""
+        Only the header fields that are used are fetched, which skips the
+        DKIM, ARC and Received headers that make up most of a header block.
+        """
         try:
-            # Convert bytes to string for IMAP fetch command
-            if isinstance(message_id, bytes):
-                msg_id_str = message_id.decode('utf-8')
-            else:
-                msg_id_str = str(message_id)
-
-            status, message_data = conn.fetch(msg_id_str, '(RFC822.HEADER)')
+            fetch_items = self._header_fetch_items
+            status, message_data = conn.uid('FETCH', str(message_id), fetch_items)
             if status != 'OK':
                 raise Exception(f"Failed to fetch message {message_id}")
 
@@ -260,55 +1047,111 @@ class IMAPSync:
             if not raw_email or not isinstance(raw_email, bytes):
                 raise Exception(f"Invalid message content for {message_id}")
 
-            email_message = email.message_from_bytes(raw_email)
-
-            # Extract key information for matching
-            subject = self._decode_header(email_message.get('Subject', ''))
-            from_addr = self._decode_header(email_message.get('From', ''))
-            message_id_header = email_message.get('Message-ID', '')
-            date = email_message.get('Date', '')
-
-            return {
-                'subject': subject,
-                'from': from_addr,
-                'message_id': message_id_header,
-                'date': date,
-                'uid': message_id.decode() if isinstance(message_id, bytes) else str(message_id)
-            }
+            message_info = self._parse_message_info(raw_email, message_id)
+            if fetch_items is GMAIL_LABEL_FETCH_ITEMS:
+                message_info['labels'] = _fetched_labels(message_data[0][0])
+            return message_info
 
         except Exception as e:
-            self.logger.error(f"Error getting message info: {e}")
+            self.logger.error("Error getting message info: %s", e)
             raise
 
-    def _decode_header(self, header_value: str) -> str:
-        """Decode email header value with improved Unicode handling."""
-        if not header_value:
-            return ''
+    def get_message_infos(self, conn: imaplib.IMAP4_SSL, message_ids: List[int]) -> Dict[int, Dict]:
+        """Get message information for several messages with a single FETCH.
 
-        try:
-            decoded_parts = decode_header(header_value)
-            decoded_string = ''
+        Only the headers needed for verification are requested, using
+        BODY.PEEK so the source messages are not marked as seen. When a
+        trust_label is configured for a Gmail source, X-GM-LABELS is fetched
+        as well and stored under 'labels'. Messages the
+        bulk response does not cover (or servers that reject multi-message
+        FETCH) fall back to get_message_info one message at a time.
 
-            for part, encoding in decoded_parts:
-                if isinstance(part, bytes):
-                    # Try specific encoding first, then fallback to utf-8, then latin-1
-                    try:
-                        decoded_string += part.decode(encoding or 'utf-8')
-                    except (UnicodeDecodeError, LookupError):
-                        try:
-                            decoded_string += part.decode('utf-8')
-                        except UnicodeDecodeError:
-                            decoded_string += part.decode('latin-1', errors='replace')
-                else:
-                    decoded_string += str(part)
+        Returns:
+            Dict mapping each fetched message ID to its message information
+        """
+        message_infos = {}
+        if not message_ids:
+            return message_infos
 
-            return decoded_string
+        try:
+            fetch_items = self._header_fetch_items
+            status, message_data = conn.uid('FETCH', _compact_uid_set(message_ids), fetch_items)
+            if status == 'OK':
+                with_labels = fetch_items is GMAIL_LABEL_FETCH_ITEMS
+                for fetched_id, response_header, raw_header in _iter_fetched(message_data):
+                    message_info = self._parse_message_info(raw_header, fetched_id)
+                    if with_labels:
+                        message_info['labels'] = _fetched_labels(response_header)
+                    message_infos[fetched_id] = message_info
+            else:
+                self.logger.warning("Bulk header fetch failed: %s, fetching messages individually", status)
         except Exception as e:
-            # Return sanitized version if all else fails
+            self.logger.warning("Bulk header fetch error: %s, fetching messages individually", e)
+
+        for message_id in message_ids:
+            if message_id not in message_infos:
+                try:
+                    message_infos[message_id] = self.get_message_info(conn, message_id)
+                except Exception:
+                    continue
+
+        return message_infos
+
+    def _iter_header_batches(self, conn: imaplib.IMAP4_SSL,
+                             message_ids: List[int]) -> Iterator[Tuple[List[int], Dict[int, Dict]]]:
+        """Yield message ID batches with their headers, prefetching the next batches.
+
+        FETCHes for up to HEADER_PREFETCH_DEPTH batches ahead run one after
+        another on a worker thread while the caller processes the current
+        batch, so a slow batch on either side does not stall the other. The
+        connection is used only by that worker until the generator is
+        exhausted, so callers must not issue other commands on it while
+        iterating.
+
+        Yields:
+            Tuples of (batch of message IDs, message information by ID)
+        """
+        batches = [message_ids[i:i + FETCH_BATCH_SIZE] for i in range(0, len(message_ids), FETCH_BATCH_SIZE)]
+        if not batches:
+            return
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            pending = deque()
+            next_batch = 0
             try:
-                return str(header_value).encode('ascii', errors='replace').decode('ascii')
-            except Exception:
-                return f"[Encoding Error: {str(e)}]"
+                while pending or next_batch < len(batches):
+                    while next_batch < len(batches) and len(pending) < HEADER_PREFETCH_DEPTH:
+                        batch = batches[next_batch]
+                        pending.append((batch, executor.submit(self.get_message_infos, conn, batch)))
+                        next_batch += 1
+                    batch, future = pending.popleft()
+                    yield batch, future.result()
+            finally:
+                # Don't fetch batches nobody will read if the caller stops early
+                for _, future in pending:
+                    future.cancel()
+
+    def _parse_message_info(self, raw_header: bytes, message_id: int) -> Dict:
+        """Extract the fields used for verification from raw message headers."""
+        headers = _parse_headers(raw_header)
+
+        # Extract key information for matching
+        subject = self._decode_header(headers.get('subject', ''))
+        from_addr = self._decode_header(headers.get('from', ''))
+        message_id_header = headers.get('message-id', '')
+        date = headers.get('date', '')
+
+        return {
+            'subject': subject,
+            'from': from_addr,
+            'message_id': message_id_header,
+            'date': date,
+            'uid': message_id
+        }
+
+    # Shared, memoized implementations (see the module-level functions)
+    _decode_header = staticmethod(_decode_header)
+    _safe_search_string = staticmethod(_safe_search_string)
 
     def _safe_log_string(self, text: str) -> str:
         """Create a safe ASCII representation of text for logging."""
@@ -320,27 +1163,6 @@ class IMAPSync:
         except Exception:
             return '[Encoding Error]'
 
-    def _safe_search_string(self, text: str) -> str:
-        """Create a safe ASCII string for IMAP search commands."""
-        if not text:
-            return ''
-        try:
-            # Extract ASCII-only parts, skip non-ASCII to avoid IMAP errors
-            ascii_text = ''.join(char for char in text if ord(char) < 128 and char.isprintable())
-            # Remove extra spaces and quotes that could break IMAP search
-            cleaned = ' '.join(ascii_text.replace('"', '').split())
-            # Only return if we have meaningful text
-            if len(cleaned) >= 3:
-                # For email addresses, preserve them as-is
-                if '@' in cleaned and '.' in cleaned:
-                    return cleaned
-                # For other text, only return if it has some letters
-                elif any(c.isalpha() for c in cleaned):
-                    return cleaned
-            return ''
-        except Exception:
-            return ''
-
     def _clean_message_id(self, message_id: str) -> str:
         """Clean Message-ID by removing various bracket formats and normalizing."""
         if not message_id:
@@ -348,12 +1170,12 @@ class IMAPSync:
 
         # Remove angle brackets, square brackets, and whitespace
         cleaned = message_id.strip('<>[]').strip()
-        self.logger.debug(f"Original Message-ID: {message_id}")
-        self.logger.debug(f"Cleaned Message-ID: {cleaned}")
+        self.logger.debug("Original Message-ID: %s", message_id)
+        self.logger.debug("Cleaned Message-ID: %s", cleaned)
 
         # Check for length issues
         if len(cleaned) > 120:
-            self.logger.debug(f"Message-ID is very long ({len(cleaned)} chars), this may cause search issues")
+            self.logger.debug("Message-ID is very long (%s chars), this may cause search issues", len(cleaned))
 
         return cleaned
 
@@ -372,8 +1194,8 @@ class IMAPSync:
         if is_gmail:
             # Gmail X-GM-RAW searches
             search_variants.extend([
-                ("Gmail X-GM-RAW clean", lambda: conn.search(None, 'X-GM-RAW', f'rfc822msgid:{clean_msg_id}')),
-                ("Gmail X-GM-RAW original", lambda: conn.search(None, 'X-GM-RAW', f'rfc822msgid:{original_msg_id}')),
+                ("Gmail X-GM-RAW clean", lambda: conn.uid('SEARCH', 'X-GM-RAW', f'rfc822msgid:{clean_msg_id}')),
+                ("Gmail X-GM-RAW original", lambda: conn.uid('SEARCH', 'X-GM-RAW', f'rfc822msgid:{original_msg_id}')),
             ])
 
             # If Message-ID is very long, try searching by partial ID
@@ -381,22 +1203,22 @@ class IMAPSync:
                 # Extract first part before @ symbol
                 local_part = clean_msg_id.split('@')[0] if '@' in clean_msg_id else clean_msg_id[:50]
                 search_variants.append(
-                    ("Gmail X-GM-RAW partial", lambda: conn.search(None, 'X-GM-RAW', f'rfc822msgid:{local_part}'))
+                    ("Gmail X-GM-RAW partial", lambda: conn.uid('SEARCH', 'X-GM-RAW', f'rfc822msgid:{local_part}'))
                 )
 
         # Standard IMAP HEADER searches
         search_variants.extend([
-            ("IMAP HEADER clean", lambda: conn.search(None, f'HEADER "Message-ID" "{clean_msg_id}"')),
-            ("IMAP HEADER with brackets", lambda: conn.search(None, f'HEADER "Message-ID" "<{clean_msg_id}>"')),
-            ("IMAP HEADER original", lambda: conn.search(None, f'HEADER "Message-ID" "{original_msg_id}"')),
+            ("IMAP HEADER clean", lambda: conn.uid('SEARCH', f'HEADER "Message-ID" "{clean_msg_id}"')),
+            ("IMAP HEADER with brackets", lambda: conn.uid('SEARCH', f'HEADER "Message-ID" "<{clean_msg_id}>"')),
+            ("IMAP HEADER original", lambda: conn.uid('SEARCH', f'HEADER "Message-ID" "{original_msg_id}"')),
         ])
 
         # Try each search variant
         for search_name, search_func in search_variants:
             try:
-                self.logger.debug(f"Trying {search_name}")
+                self.logger.debug("Trying %s", search_name)
                 status, message_ids = search_func()
-                self.logger.debug(f"{search_name} result: status={status}, found={bool(message_ids[0]) if message_ids else False}")
+                self.logger.debug("%s result: status=%s, found=%s", search_name, status, bool(message_ids[0]) if message_ids else False)
 
                 if status == 'OK' and message_ids and message_ids[0]:
                     found_ids = message_ids[0].split()
@@ -406,50 +1228,53 @@ class IMAPSync:
 
                         # Check if multiple IDs found - this indicates a problem since Message-IDs should be unique
                         if len(found_ids) > 1:
-                            for i, msg_id in enumerate(result):
-                                self.logger.debug(f"Found message ID {i+1}: {msg_id}")
+                            # Fetching subjects costs a round-trip per match, so only do it when debugging
+                            for i, msg_id in enumerate(result if self.logger.isEnabledFor(logging.DEBUG) else ()):
+                                self.logger.debug("Found message ID %s: %s", i+1, msg_id)
                                 # For debugging, fetch the message subject
                                 try:
-                                    temp_status, temp_data = conn.fetch(msg_id, '(RFC822.HEADER)')
+                                    temp_status, temp_data = conn.uid('FETCH', msg_id, '(BODY.PEEK[HEADER.FIELDS (SUBJECT)])')
                                     if temp_status == 'OK' and temp_data and temp_data[0] and len(temp_data[0]) >= 2:
                                         header_data = temp_data[0][1]
                                         if isinstance(header_data, bytes):
-                                            temp_email = email.message_from_bytes(header_data)
-                                            temp_subject = self._decode_header(temp_email.get('Subject', ''))
-                                            self.logger.debug(f"  Subject: {temp_subject[:100]}")
+                                            temp_subject = self._decode_header(_parse_headers(header_data).get('subject', ''))
+                                            self.logger.debug("  Subject: %s", temp_subject[:100])
                                 except Exception as debug_e:
-                                    self.logger.debug(f"  Could not fetch subject for debugging: {debug_e}")
-                            self.logger.debug(f"{search_name} found {len(found_ids)} messages - Message-IDs should be unique, skipping this variant")
+                                    self.logger.debug("  Could not fetch subject for debugging: %s", debug_e)
+                            self.logger.debug("%s found %s messages - Message-IDs should be unique, skipping this variant", search_name, len(found_ids))
                             continue
 
-                        self.logger.debug(f"Found {len(result)} message(s) using {search_name}")
+                        self.logger.debug("Found %s message(s) using %s", len(result), search_name)
                         return result
             except Exception as e:
-                self.logger.debug(f"{search_name} failed: {e}")
+                self.logger.debug("%s failed: %s", search_name, e)
                 continue
 
-        self.logger.debug(f"All Message-ID search variants failed for: {clean_msg_id[:50]}...")
+        self.logger.debug("All Message-ID search variants failed for: %s...", clean_msg_id[:50])
         return None
 
     def _apply_to_delete_marker(self, conn: imaplib.IMAP4_SSL, msg_id_str: str, server: str) -> bool:
-        """Apply _TO_DELETE label for Gmail or move to _TO_DELETE folder for other servers."""
+        """Apply _TO_DELETE label for Gmail or move to _TO_DELETE folder for other servers.
+
+        msg_id_str may be a single ID or a whole message set such as '1,3:7'.
+        """
         try:
             if is_gmail_server(server):
                 # For Gmail, add the _TO_DELETE label
                 try:
                     # Add the label using Gmail's X-GM-LABELS extension
-                    status, response = conn.store(msg_id_str, '+X-GM-LABELS', '("_TO_DELETE")')
+                    status, response = conn.uid('STORE', msg_id_str, '+X-GM-LABELS', '("_TO_DELETE")')
                     if status == 'OK':
-                        self.logger.debug(f"Added _TO_DELETE label to Gmail message {msg_id_str}")
+                        self.logger.debug("Added _TO_DELETE label to Gmail message %s", msg_id_str)
                         return True
                     else:
                         # Fallback: try standard IMAP flags if X-GM-LABELS doesn't work
-                        status, response = conn.store(msg_id_str, '+FLAGS', '(_TO_DELETE)')
+                        status, response = conn.uid('STORE', msg_id_str, '+FLAGS', '(_TO_DELETE)')
                         return status == 'OK'
                 except Exception as e:
-                    self.logger.debug(f"Gmail label failed, trying standard flag: {e}")
+                    self.logger.debug("Gmail label failed, trying standard flag: %s", e)
                     # Fallback to standard IMAP flag
-                    status, response = conn.store(msg_id_str, '+FLAGS', '(_TO_DELETE)')
+                    status, response = conn.uid('STORE', msg_id_str, '+FLAGS', '(_TO_DELETE)')
                     return status == 'OK'
             else:
                 # For other IMAP servers, try to move to _TO_DELETE folder
@@ -461,51 +1286,58 @@ class IMAPSync:
                         pass  # Folder might already exist
 
                     # Move the message to _TO_DELETE folder
-                    status, response = conn.move(msg_id_str, '_TO_DELETE')
+                    status, response = conn.uid('MOVE', msg_id_str, '_TO_DELETE')
                     if status == 'OK':
-                        self.logger.debug(f"Moved message {msg_id_str} to _TO_DELETE folder")
+                        self.logger.debug("Moved message %s to _TO_DELETE folder", msg_id_str)
                         return True
                     else:
                         # Fallback: copy and mark for deletion if move doesn't work
-                        status, response = conn.copy(msg_id_str, '_TO_DELETE')
+                        status, response = conn.uid('COPY', msg_id_str, '_TO_DELETE')
                         if status == 'OK':
-                            self.logger.debug(f"Copied message {msg_id_str} to _TO_DELETE folder")
+                            self.logger.debug("Copied message %s to _TO_DELETE folder", msg_id_str)
                             return True
                         return False
                 except Exception as e:
-                    self.logger.debug(f"Failed to move/copy message to _TO_DELETE folder: {e}")
+                    self.logger.debug("Failed to move/copy message to _TO_DELETE folder: %s", e)
                     # Final fallback: just add a flag
-                    status, response = conn.store(msg_id_str, '+FLAGS', '(_TO_DELETE)')
+                    status, response = conn.uid('STORE', msg_id_str, '+FLAGS', '(_TO_DELETE)')
                     return status == 'OK'
         except Exception as e:
-            self.logger.error(f"Error applying _TO_DELETE marker: {e}")
+            self.logger.error("Error applying _TO_DELETE marker: %s", e)
             return False
 
-    def _apply_migrated_marker(self, conn: imaplib.IMAP4_SSL, message_info: Dict, server: str, folder: str) -> bool:
-        """Apply _MIGRATED label for Gmail or move to _MIGRATED folder for other servers."""
+    def _apply_migrated_marker(self, conn: imaplib.IMAP4_SSL, message_info: Dict, server: str, folder: str,
+                               target_message_id: str = '') -> bool:
+        """Apply _MIGRATED label for Gmail or move to _MIGRATED folder for other servers.
+
+        If target_message_id is given (e.g. from prefetch_target_message_ids), the
+        target folder must already be selected and no search is performed. It
+        may also be a message set, marking a whole batch with one command.
+        """
         try:
             # First, find the message in the target mailbox
-            target_message_id = self._find_message_in_target(conn, message_info, server, folder)
             if not target_message_id:
-                self.logger.debug(f"Could not find message in target for _MIGRATED marker")
+                target_message_id = self._find_message_in_target(conn, message_info, server, folder)
+            if not target_message_id:
+                self.logger.debug("Could not find message in target for _MIGRATED marker")
                 return False
 
             if is_gmail_server(server):
                 # For Gmail, add the _MIGRATED label
                 try:
                     # Add the label using Gmail's X-GM-LABELS extension
-                    status, response = conn.store(target_message_id, '+X-GM-LABELS', '("_MIGRATED")')
+                    status, response = conn.uid('STORE', target_message_id, '+X-GM-LABELS', '("_MIGRATED")')
                     if status == 'OK':
-                        self.logger.debug(f"Added _MIGRATED label to Gmail message {target_message_id}")
+                        self.logger.debug("Added _MIGRATED label to Gmail message %s", target_message_id)
                         return True
                     else:
                         # Fallback: try standard IMAP flags if X-GM-LABELS doesn't work
-                        status, response = conn.store(target_message_id, '+FLAGS', '(_MIGRATED)')
+                        status, response = conn.uid('STORE', target_message_id, '+FLAGS', '(_MIGRATED)')
                         return status == 'OK'
                 except Exception as e:
-                    self.logger.debug(f"Gmail _MIGRATED label failed, trying standard flag: {e}")
+                    self.logger.debug("Gmail _MIGRATED label failed, trying standard flag: %s", e)
                     # Fallback to standard IMAP flag
-                    status, response = conn.store(target_message_id, '+FLAGS', '(_MIGRATED)')
+                    status, response = conn.uid('STORE', target_message_id, '+FLAGS', '(_MIGRATED)')
                     return status == 'OK'
             else:
                 # For other IMAP servers, try to copy to _MIGRATED folder
@@ -517,165 +1349,530 @@ class IMAPSync:
                         pass  # Folder might already exist
 
                     # Copy the message to _MIGRATED folder
-                    status, response = conn.copy(target_message_id, '_MIGRATED')
+                    status, response = conn.uid('COPY', target_message_id, '_MIGRATED')
                     if status == 'OK':
-                        self.logger.debug(f"Copied message {target_message_id} to _MIGRATED folder")
+                        self.logger.debug("Copied message %s to _MIGRATED folder", target_message_id)
                         return True
                     else:
                         # Fallback: just add a flag
-                        status, response = conn.store(target_message_id, '+FLAGS', '(_MIGRATED)')
+                        status, response = conn.uid('STORE', target_message_id, '+FLAGS', '(_MIGRATED)')
                         return status == 'OK'
                 except Exception as e:
-                    self.logger.debug(f"Failed to copy message to _MIGRATED folder: {e}")
+                    self.logger.debug("Failed to copy message to _MIGRATED folder: %s", e)
                     # Final fallback: just add a flag
-                    status, response = conn.store(target_message_id, '+FLAGS', '(_MIGRATED)')
+                    status, response = conn.uid('STORE', target_message_id, '+FLAGS', '(_MIGRATED)')
                     return status == 'OK'
         except Exception as e:
-            self.logger.error(f"Error applying _MIGRATED marker: {e}")
+            self.logger.error("Error applying _MIGRATED marker: %s", e)
             return False
 
     def _find_message_in_target(self, conn: imaplib.IMAP4_SSL, message_info: Dict, server: str, folder: str) -> str:
         """Find the message ID in the target mailbox for applying markers."""
         try:
             # Use the same folder selection logic as verify_message_exists
-            is_gmail = is_gmail_server(server)
-
-            if is_gmail:
-                # For Gmail, try to use All Mail folder
-                gmail_folders = [
-                    '"[Gmail]/All Mail"',    # Quoted version
-                    '[Gmail]/All Mail',      # Original
-                    '"All Mail"',            # Simple quoted
-                    'All Mail',              # Simple
-                    folder                   # Fallback to specified folder
-                ]
-
-                selected_folder = None
-                for gmail_folder in gmail_folders:
-                    try:
-                        status, messages = conn.select(gmail_folder)
-                        if status == 'OK':
-                            selected_folder = gmail_folder
-                            break
-                    except Exception:
-                        continue
-
-                if not selected_folder:
-                    return ''
-            else:
-                # Standard folder selection for non-Gmail
-                status, messages = conn.select(folder)
-                if status != 'OK':
-                    return ''
+            if not self._select_verification_folder(conn, folder, server):
+                return ''
 
             # Search by Message-ID to find the target message
             if message_info['message_id']:
                 try:
                     # Reuse the comprehensive Message-ID search variants to get message IDs directly
-                    found_message_ids = self._try_message_id_variants(conn, message_info['message_id'], is_gmail)
+                    found_message_ids = self._try_message_id_variants(conn, message_info['message_id'], is_gmail_server(server))
                     if found_message_ids:
                         # Return the first found message ID
                         return found_message_ids[0]
                 except Exception as e:
-                    self.logger.debug(f"Error finding message in target: {e}")
+                    self.logger.debug("Error finding message in target: %s", e)
 
             return ''
         except Exception as e:
-            self.logger.debug(f"Error in _find_message_in_target: {e}")
+            self.logger.debug("Error in _find_message_in_target: %s", e)
             return ''
 
+    def _all_mail_folder(self, conn: imaplib.IMAP4_SSL) -> str:
+        """Get the connection's All Mail folder, looking it up with LIST on first use."""
+        name = getattr(conn, '_allmail_folder', None)
+        if not isinstance(name, str):
+            name = _find_all_mail_folder(conn)
+            conn._allmail_folder = name
+        return name
+
+    def _select_verification_folder(self, conn: imaplib.IMAP4_SSL, folder: str, server: str = '') -> bool:
+        """Select the target folder searched during verification.
+
+        Gmail targets prefer All Mail so messages are found regardless of label.
+
+        Returns:
+            True if a folder was selected
+        """
+        if is_gmail_server(server):
+            # For Gmail, use the All Mail folder for comprehensive search
+            all_mail = self._all_mail_folder(conn)
+            gmail_folders = [all_mail, folder] if all_mail else [folder]
+
+            for gmail_folder in gmail_folders:
+                try:
+                    status, messages = _select(conn, gmail_folder)
+                    if status == 'OK':
+                        self.logger.debug("Using Gmail folder '%s' for verification", gmail_folder)
+                        return True
+                except Exception:
+                    continue
+
+            self.logger.warning("Could not select any Gmail folder for verification")
+            return False
+
+        # Standard folder selection for non-Gmail
+        status, messages = _select(conn, folder)
+        if status != 'OK':
+            self.logger.warning("Could not select folder %s for verification", folder)
+            return False
+        return True
+
+    def prefetch_target_message_ids(self, conn: imaplib.IMAP4_SSL, folder: str,
+                                    message_ids: List[str], server: str = '') -> Dict[str, int]:
+        """Look up many Message-IDs in the target mailbox with batched searches.
+
+        Each batch of VERIFY_BATCH_SIZE Message-IDs is combined into a single
+        OR-chained HEADER search, and the Message-ID headers of the matches are
+        fetched back so every hit is checked exactly (HEADER search matches
+        substrings). Gmail targets are searched with an X-GM-RAW rfc822msgid
+        query instead, which Gmail answers from its search index; the HEADER
+        search is used if it fails.
+
+        Args:
+            conn: Target IMAP connection
+            folder: Target folder to search
+            message_ids: Message-ID header values from the source messages
+            server: Target server name, used for Gmail folder selection
+
+        Returns:
+            Dict mapping each cleaned Message-ID found in the target to its
+            target UID
+
+        Raises:
+            Exception: If the folder cannot be selected or a search fails, so the
+                caller can fall back to verifying messages one by one
+        """
+        found = {}
+        clean_ids = list(dict.fromkeys(
+            clean_id for clean_id in (self._clean_message_id(mid) for mid in message_ids) if clean_id
+        ))
+        if not clean_ids:
+            return found
+
+        if not self._select_verification_folder(conn, folder, server):
+            raise Exception(f"Could not select folder {folder} for verification")
+
+        is_gmail = is_gmail_server(server)
+        for start in range(0, len(clean_ids), VERIFY_BATCH_SIZE):
+            batch = clean_ids[start:start + VERIFY_BATCH_SIZE]
+            status = None
+            # Gmail's search syntax has no escapes, so a batch holding an ID it
+            # cannot express uses the HEADER search instead
+            if is_gmail and not any(_GMAIL_QUERY_SPECIAL_RE.search(mid) for mid in batch):
+                # Braces OR the terms together in Gmail's search syntax
+                gmail_query = '{' + ' '.join(f'rfc822msgid:{mid}' for mid in batch) + '}'
+                try:
+                    status, data = conn.uid('SEARCH', 'X-GM-RAW', _imap_quote(gmail_query))
+                except Exception as e:
+                    self.logger.debug("Gmail Message-ID search failed: %s", e)
+            if status != 'OK':
+                query = '(' + 'OR ' * (len(batch) - 1) + ' '.join(
+                    'HEADER Message-ID ' + _imap_quote(mid) for mid in batch
+                ) + ')'
+                status, data = conn.uid('SEARCH', query)
+            if status != 'OK':
+                raise Exception(f"Bulk Message-ID search failed: {status}")
+
+            matches = _parse_uid_list(data)
+            if not matches:
+                continue
+
+            status, fetched = conn.uid('FETCH', _compact_uid_set(matches), TARGET_ID_FETCH_ITEMS)
+            if status != 'OK':
+                raise Exception(f"Fetching target Message-IDs failed: {status}")
+
+            wanted = set(batch)
+            for target_uid, _, raw_header in _iter_fetched(fetched):
+                match = _MESSAGE_ID_HEADER_RE.search(raw_header)
+                if match:
+                    clean_id = match.group(1).decode('ascii', 'replace').strip('<>[]').strip()
+                    if clean_id in wanted and clean_id not in found:
+                        found[clean_id] = target_uid
+
+        self.logger.debug("Found %s of %s Message-IDs in target", len(found), len(clean_ids))
+        return found
+
+    def _prefetch_target_sharded(self, conns: List[imaplib.IMAP4_SSL], folder: str,
+                                 message_ids: List[str], server: str = '') -> Dict[str, int]:
+        """Split prefetch_target_message_ids across several target connections.
+
+        Shards are whole multiples of VERIFY_BATCH_SIZE, so every connection
+        still sends full OR-chained searches. Each connection is used by
+        exactly one worker thread.
+
+        Raises:
+            Exception: If any shard fails, as prefetch_target_message_ids does
+        """
+        batch_count = -(-len(message_ids) // VERIFY_BATCH_SIZE)
+        if len(conns) == 1 or batch_count <= 1:
+            return self.prefetch_target_message_ids(conns[0], folder, message_ids, server)
+
+        shard_size = -(-batch_count // len(conns)) * VERIFY_BATCH_SIZE
+        found = {}
+        with ThreadPoolExecutor(max_workers=len(conns)) as executor:
+            futures = [
+                executor.submit(self.prefetch_target_message_ids, conn, folder,
+                                message_ids[start:start + shard_size], server)
+                for conn, start in zip(conns, range(0, len(message_ids), shard_size))
+            ]
+            for future in as_completed(futures):
+                found.update(future.result())
+        return found
+
+    def build_target_index(self, conn: imaplib.IMAP4_SSL, folder: str, server: str = '',
+                           since: str = '') -> Dict[str, int]:
+        """Index the Message-IDs of every message in the target folder.
+
+        Only the Message-ID header is fetched, FETCH_BATCH_SIZE messages per
+        command, and it is read with a regex rather than a header parser.
+
+        Args:
+            conn: Target IMAP connection
+            folder: Target folder to index
+            server: Target server name, used for Gmail folder selection
+            since: Optional IMAP date (e.g. "01-Jan-2024") limiting the index
+                to messages received on or after it
+
+        Returns:
+            Dict mapping each cleaned Message-ID in the folder to its target UID
+
+        Raises:
+            Exception: If the folder cannot be selected or a command fails
+        """
+        if not self._select_verification_folder(conn, folder, server):
+            raise Exception(f"Could not select folder {folder} for verification")
+
+        criteria = ('SINCE', f'"{since}"') if since else ('ALL',)
+        status, data = conn.uid('SEARCH', *criteria)
+        if status != 'OK':
+            raise Exception(f"Target folder search failed: {status}")
+        target_uids = _parse_uid_list(data)
+
+        index = {}
+        for start in range(0, len(target_uids), FETCH_BATCH_SIZE):
+            message_set = _compact_uid_set(target_uids[start:start + FETCH_BATCH_SIZE])
+            status, fetched = conn.uid('FETCH', message_set, TARGET_ID_FETCH_ITEMS)
+            if status != 'OK':
+                raise Exception(f"Fetching target Message-IDs failed: {status}")
+            for target_uid, _, raw_header in _iter_fetched(fetched):
+                match = _MESSAGE_ID_HEADER_RE.search(raw_header)
+                if match:
+                    clean_id = match.group(1).decode('ascii', 'replace').strip('<>[]').strip()
+                    index.setdefault(clean_id, target_uid)
+        return index
+
+    def _build_configured_target_index(self, folder: str, server: str) -> Optional[Dict[str, int]]:
+        """Index the target folder as configured by "target_index" (true or a SINCE date).
+
+        Returns:
+            The index, or None if indexing failed and the target should be
+            searched per batch instead
+        """
+        setting = self.config.get('target_index')
+        since = setting if isinstance(setting, str) else ''
+        try:
+            index = self.build_target_index(self.target_conn, folder, server, since)
+        except Exception as e:
+            self.logger.warning("Indexing the target folder failed: %s, searching per batch", e)
+            return None
+        self.logger.info("Indexed %d Message-IDs in the target folder", len(index))
+        return index
+
     def verify_message_exists(self, conn: imaplib.IMAP4_SSL, folder: str,
                             message_info: Dict, server: str = '') -> bool:
         """Verify if a message exists in the target mailbox."""
         try:
-            # Use Gmail folder optimization for target mailbox too
-            is_gmail = is_gmail_server(server)
-
-            if is_gmail:
-                # For Gmail, try to use All Mail folder for comprehensive search
-                gmail_folders = [
-                    '"[Gmail]/All Mail"',    # Quoted version
-                    '[Gmail]/All Mail',      # Original
-                    '"All Mail"',            # Simple quoted
-                    'All Mail',              # Simple
-                    folder                   # Fallback to specified folder
-                ]
-
-                selected_folder = None
-                for gmail_folder in gmail_folders:
-                    try:
-                        status, messages = conn.select(gmail_folder)
-                        if status == 'OK':
-                            selected_folder = gmail_folder
-                            self.logger.debug(f"Using Gmail folder '{gmail_folder}' for verification")
-                            break
-                    except Exception:
-                        continue
-
-                if not selected_folder:
-                    self.logger.warning(f"Could not select any Gmail folder for verification")
-                    return False
-            else:
-                # Standard folder selection for non-Gmail
-                status, messages = conn.select(folder)
-                if status != 'OK':
-                    self.logger.warning(f"Could not select folder {folder} for verification")
-                    return False
+            if not self._select_verification_folder(conn, folder, server):
+                return False
 
             # Search by Message-ID using comprehensive search strategy
             if message_info['message_id']:
-                self.logger.debug(f"Starting comprehensive Message-ID search")
-                found_message_ids = self._try_message_id_variants(conn, message_info['message_id'], is_gmail)
+                self.logger.debug("Starting comprehensive Message-ID search")
+                found_message_ids = self._try_message_id_variants(conn, message_info['message_id'], is_gmail_server(server))
                 if found_message_ids:
                     return True
 
             return False
 
         except Exception as e:
-            self.logger.error(f"Error verifying message: {e}")
+            self.logger.error("Error verifying message: %s", e)
             return False
 
-    def delete_message(self, conn: imaplib.IMAP4_SSL, message_id: bytes,
+    def delete_message(self, conn: imaplib.IMAP4_SSL, message_id: int,
                       dry_run: bool = False, message_subject: str = '',
                       current_index: int = 0, total_count: int = 0, deletion_count: int = 0,
                       server: str = '') -> bool:
         """Delete a message from the mailbox."""
         try:
-            # Convert message_id to string for consistency
-            msg_id_str = message_id.decode() if isinstance(message_id, bytes) else str(message_id)
+            msg_id_str = str(message_id)
 
             if dry_run:
                 # Instead of just logging, apply _TO_DELETE label/folder for dry run
                 success = self._apply_to_delete_marker(conn, msg_id_str, server)
                 if success:
                     if message_subject and deletion_count > 0 and total_count > 0:
-                        self.logger.info(f"({deletion_count} of {total_count}) DRY RUN: Would delete message - ID: {msg_id_str} - Subject: {message_subject}")
+                        self.logger.info("(%s of %s) DRY RUN: Would delete message - ID: %s - Subject: %s", deletion_count, total_count, msg_id_str, message_subject)
                     else:
-                        self.logger.info(f"DRY RUN: Would delete message - ID: {msg_id_str}")
+                        self.logger.info("DRY RUN: Would delete message - ID: %s", msg_id_str)
                 else:
                     if message_subject and deletion_count > 0 and total_count > 0:
-                        self.logger.warning(f"({deletion_count} of {total_count}) DRY RUN: Would delete message - ID: {msg_id_str} - Subject: {message_subject}")
+                        self.logger.warning("(%s of %s) DRY RUN: Would delete message - ID: %s - Subject: %s", deletion_count, total_count, msg_id_str, message_subject)
                     else:
-                        self.logger.warning(f"DRY RUN: Failed to apply _TO_DELETE marker to message {msg_id_str}")
+                        self.logger.warning("DRY RUN: Failed to apply _TO_DELETE marker to message %s", msg_id_str)
                 return success
 
             # Mark message for deletion (convert back to string for store command)
-            conn.store(msg_id_str, '+FLAGS', '\\Deleted')
+            conn.uid('STORE', msg_id_str, '+FLAGS.SILENT', '\\Deleted')
             if deletion_count > 0 and total_count > 0:
-                self.logger.info(f"({deletion_count} of {total_count}) Marked message (ID: {msg_id_str}) for deletion")
+                self.logger.info("(%s of %s) Marked message (ID: %s) for deletion", deletion_count, total_count, msg_id_str)
             elif deletion_count > 0:
-                self.logger.info(f"Marked message #{deletion_count} (ID: {msg_id_str}) for deletion")
+                self.logger.info("Marked message #%s (ID: %s) for deletion", deletion_count, msg_id_str)
             else:
-                self.logger.info(f"Marked message {msg_id_str} for deletion")
+                self.logger.info("Marked message %s for deletion", msg_id_str)
             return True
 
         except Exception as e:
-            msg_id_str = message_id.decode() if isinstance(message_id, bytes) else str(message_id)
-            self.logger.error(f"Error deleting message {msg_id_str}: {e}")
+            self.logger.error("Error deleting message %s: %s", message_id, e)
             return False
 
-    def run_sync(self, dry_run: bool = False) -> Dict:
-        """Run the email synchronization process."""
+    def delete_messages(self, conn: imaplib.IMAP4_SSL, to_delete: List[Tuple[int, str, int, int]],
+                        dry_run: bool = False, total_count: int = 0, server: str = '') -> int:
+        """Delete several messages using one STORE per STORE_BATCH_SIZE messages.
+
+        In dry run the _TO_DELETE marker is applied to each batch instead. A
+        batch whose command fails is retried one message at a time through
+        delete_message.
+
+        Args:
+            conn: Source IMAP connection
+            to_delete: (message ID, subject, index, deletion count) tuples
+            dry_run: Apply the _TO_DELETE marker instead of deleting
+            total_count: Number of messages processed, used in log lines
+            server: Source server name
+
+        Returns:
+            Number of messages successfully deleted (or marked)
+        """
+        deleted = 0
+        for start in range(0, len(to_delete), STORE_BATCH_SIZE):
+            batch = to_delete[start:start + STORE_BATCH_SIZE]
+            message_set = _compact_uid_set(message_id for message_id, _, _, _ in batch)
+            try:
+                if dry_run:
+                    success = self._apply_to_delete_marker(conn, message_set, server)
+                else:
+                    # .SILENT stops the server echoing a FETCH response per message
+                    status, response = conn.uid('STORE', message_set, '+FLAGS.SILENT', '\\Deleted')
+                    success = status == 'OK'
+            except Exception as e:
+                self.logger.warning("Bulk delete of %s failed: %s", message_set, e)
+                success = False
+
+            if not success:
+                for message_id, display_subject, index, count in batch:
+                    if self.delete_message(conn, message_id, dry_run, display_subject, index, total_count, count, server):
+                        deleted += 1
+                continue
+
+            deleted += len(batch)
+            for message_id, display_subject, index, count in batch:
+                if dry_run:
+                    self.logger.info("(%s of %s) DRY RUN: Would delete message - ID: %s - Subject: %s", count, total_count, message_id, display_subject)
+                else:
+                    self.logger.info("(%s of %s) Marked message (ID: %s) for deletion", count, total_count, message_id)
+        return deleted
+
+    def _delete_saved_search(self, dry_run: bool, server: str = '') -> bool:
+        """Delete (or mark, in dry run) every message of the saved "$" search result.
+
+        Returns:
+            True if the command succeeded, False to fall back to explicit IDs
+        """
+        try:
+            if dry_run:
+                success = self._apply_to_delete_marker(self.source_conn, '$', server)
+                if success:
+                    self.logger.info("DRY RUN: Would delete all messages matching the search")
+                return success
+
+            status, response = self.source_conn.uid('STORE', '$', '+FLAGS.SILENT', '\\Deleted')
+            if status != 'OK':
+                return False
+            self.logger.info("Marked all messages matching the search for deletion")
+            return True
+        except Exception as e:
+            self.logger.warning("Deleting saved search result failed: %s, deleting messages individually", e)
+            return False
+
+    def expunge_messages(self, conn: imaplib.IMAP4_SSL, message_ids: List[int]):
+        """Expunge the given messages, or every deleted message without UIDPLUS.
+
+        With UIDPLUS, UID EXPUNGE only removes the listed UIDs, so messages
+        another client flagged \\Deleted in the same folder are left alone.
+        """
+        if message_ids and _has_capability(conn, 'UIDPLUS'):
+            try:
+                for start in range(0, len(message_ids), STORE_BATCH_SIZE):
+                    status, response = conn.uid('EXPUNGE', _compact_uid_set(message_ids[start:start + STORE_BATCH_SIZE]))
+                    if status != 'OK':
+                        raise Exception(f"UID EXPUNGE failed: {status}")
+                return
+            except Exception as e:
+                self.logger.warning("%s, expunging the whole folder", e)
+        conn.expunge()
+
+    def _ensure_connected(self, conn: Optional[imaplib.IMAP4_SSL], mailbox_config: Dict) -> imaplib.IMAP4_SSL:
+        """Return conn if it is still usable, otherwise open a new connection."""
+        if conn is not None and getattr(conn, 'state', None) != 'LOGOUT':
+            try:
+                self.noop_if_idle(conn)
+                return conn
+            except (imaplib.IMAP4.abort, OSError) as e:
+                self.logger.info("Connection to %s lost (%s), reconnecting", mailbox_config['server'], e)
+        return self.connect_imap(mailbox_config)
+
+    def noop_if_idle(self, conn: imaplib.IMAP4_SSL) -> bool:
+        """Send NOOP if nothing was sent on conn for NOOP_IDLE_SECONDS.
+
+        Returns:
+            True if a NOOP was sent
+
+        Raises:
+            imaplib.IMAP4.abort, OSError: If the connection was dropped
+        """
+        now = time.monotonic()
+        if now - self._last_activity.get(conn, 0.0) > NOOP_IDLE_SECONDS:
+            conn.noop()
+            self._last_activity[conn] = now
+            return True
+        return False
+
+    def _connect_both(self):
+        """Connect (or reconnect) to the source and target mailboxes concurrently.
+
+        The two logins are independent, so their TLS handshakes and
+        authentication round-trips overlap. A connection that succeeds is
+        kept even if the other fails, so close_connections can log it out.
+        """
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            source_future = executor.submit(self._ensure_connected, self.source_conn, self.config['source_mailbox'])
+            target_future = executor.submit(self._ensure_connected, self.target_conn, self.config['target_mailbox'])
+
+        source_error, target_error = source_future.exception(), target_future.exception()
+        self.source_conn = None if source_error else source_future.result()
+        self.target_conn = None if target_error else target_future.result()
+        if source_error or target_error:
+            raise source_error or target_error
+
+    def _connect_target_pool(self) -> List[imaplib.IMAP4_SSL]:
+        """Return the target connections used for verification searches.
+
+        "target_parallelism" (default 1) sets how many target connections are
+        used; the extra ones are opened concurrently and reused between
+        cycles. Keep it below the server's per-IP connection limit (e.g.
+        Dovecot's mail_max_userip_connections, 10 by default). A connection
+        that cannot be opened is skipped, so verification carries on with
+        fewer connections. IMAP4_SSL is not thread-safe, so connections are
+        never shared between threads.
+        """
+        extra_count = max(1, int(self.config.get('target_parallelism', 1))) - 1
+        if extra_count <= 0:
+            return [self.target_conn]
+
+        slots = (self._extra_target_conns + [None] * extra_count)[:extra_count]
+        with ThreadPoolExecutor(max_workers=extra_count) as executor:
+            futures = [executor.submit(self._ensure_connected, conn, self.config['target_mailbox'])
+                       for conn in slots]
+
+        self._extra_target_conns = []
+        for future in futures:
+            if future.exception():
+                self.logger.warning("Could not open extra target connection: %s", future.exception())
+            else:
+                self._extra_target_conns.append(future.result())
+        return [self.target_conn] + self._extra_target_conns
+
+    @staticmethod
+    def _close_connection(conn: imaplib.IMAP4_SSL):
+        """Close the selected folder and log out, ignoring errors."""
+        try:
+            conn.close()
+            conn.logout()
+        except:
+            pass
+
+    def close_connections(self):
+        """Close and log out of every open connection concurrently."""
+        conns = [conn for conn in (self.source_conn, self.target_conn, *self._extra_target_conns) if conn]
+        if conns:
+            with ThreadPoolExecutor(max_workers=len(conns)) as executor:
+                list(executor.map(self._close_connection, conns))
+        self.source_conn = None
+        self.target_conn = None
+        self._extra_target_conns = []
+
+    def _verifies_against_source(self) -> bool:
+        """Check whether target verification would search the source messages themselves.
+
+        With the same account on both sides, verification finds the source
+        message itself if it searches the source folder, or Gmail's All Mail
+        (which holds every message of the account). Every message would then
+        look migrated and be deleted.
+        """
+        source = self.config['source_mailbox']
+        target = self.config['target_mailbox']
+        same_account = (source['server'].lower() == target['server'].lower()
+                        and source['username'].lower() == target['username'].lower())
+        return same_account and (is_gmail_server(target['server']) or source['folder'] == target['folder'])
+
+    def run_forever(self, interval: int, dry_run: bool = False):
+        """Run sync cycles every interval seconds, reusing the connections between them.
+
+        Idle connections are kept alive with NOOP while waiting and are
+        reopened lazily if the server dropped them.
+        """
+        try:
+            while True:
+                results = self.run_sync(dry_run, keep_connections=True)
+                self.logger.info("Sync cycle finished: %s deleted, %s errors; next cycle in %ss",
+                                 results['deleted'], results['errors'], interval)
+
+                deadline = time.monotonic() + interval
+                while (remaining := deadline - time.monotonic()) > 0:
+                    time.sleep(min(remaining, NOOP_IDLE_SECONDS))
+                    for conn in (self.source_conn, self.target_conn, *self._extra_target_conns):
+                        if conn is None:
+                            continue
+                        try:
+                            self.noop_if_idle(conn)
+                        except (imaplib.IMAP4.abort, OSError):
+                            # Still idle, so _ensure_connected retries the NOOP and
+                            # reconnects on the next cycle
+                            pass
+        finally:
+            self.close_connections()
+
+    def run_sync(self, dry_run: bool = False, keep_connections: bool = False) -> Dict:
+        """Run the email synchronization process.
+
+        Args:
+            dry_run: Mark messages instead of deleting them
+            keep_connections: Leave both connections open for the next call
+                (used by run_forever); they are reused if still alive. Always
+                the case inside a "with IMAPSync(...)" block
+        """
         results = {
             'processed': 0,
             'verified': 0,
@@ -683,92 +1880,166 @@ class IMAPSync:
             'errors': 0
         }
 
+        keep_connections = keep_connections or self._managed
         try:
+            if self._verifies_against_source():
+                raise Exception("Source and target are the same mailbox; messages would be verified "
+                                "against themselves. Use a different target account or folder")
+
             # Connect to both mailboxes
             self.logger.info("Starting email synchronization")
-            self.source_conn = self.connect_imap(self.config['source_mailbox'])
-            self.target_conn = self.connect_imap(self.config['target_mailbox'])
+            self._connect_both()
 
             # Search for emails in source mailbox
             source_folder = self.config['source_mailbox']['folder']
             target_folder = self.config['target_mailbox']['folder']
-            search_criteria = self.config.get('search_criteria', {})
+            search_criteria = self._search_criteria
             source_server = self.config['source_mailbox']['server']
             target_server = self.config['target_mailbox']['server']
 
-            message_ids = self.search_emails(self.source_conn, source_folder, search_criteria, source_server)
+            cache_key = UIDCache.make_key(source_server, self.config['source_mailbox']['username'],
+                                          source_folder, search_criteria)
+            # With "target_index" set, the target folder is indexed on a worker
+            # thread while the source is searched; each connection is only used
+            # by one thread at a time
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                index_future = (executor.submit(self._build_configured_target_index, target_folder, target_server)
+                                if self.config.get('target_index') else None)
+                message_ids = self.search_emails(self.source_conn, source_folder, search_criteria, source_server,
+                                                 cache_key)
+            folder_index = index_future.result() if index_future else None
             results['processed'] = len(message_ids)
 
             if not message_ids:
                 self.logger.info("No messages found matching criteria")
                 return results
 
-            # Process each message
+            target_conns = self._connect_target_pool() if folder_index is None else [self.target_conn]
+
+            # Verify each message against the target. Source headers for the next
+            # batch are fetched in the background while the current batch is
+            # checked, so the source and target round-trips overlap.
             total_count = len(message_ids)
             deletion_count = 0  # Separate counter for messages to be deleted
-            for current_index, message_id in enumerate(message_ids, 1):
-                try:
-                    # Get message info from source
-                    message_info = self.get_message_info(self.source_conn, message_id)
-                    # Display Unicode characters properly in logging
-                    display_subject = message_info['subject'][:50] if message_info['subject'] else '[No Subject]'
-                    self.logger.info(f"[{current_index}/{total_count}] Processing: {display_subject}...")
-
-                    # Verify message exists in target
-                    self.logger.debug(f"Verifying message in target: Message-ID={message_info.get('message_id', 'None')}, Subject={message_info.get('subject', 'None')[:30]}")
-                    if self.verify_message_exists(self.target_conn, target_folder, message_info, target_server):
-                        self.logger.info(f"Message verified in target mailbox")
-                        results['verified'] += 1
-
-                        # Apply _MIGRATED marker to target mailbox for verification
-                        self._apply_migrated_marker(self.target_conn, message_info, target_server, target_folder)
-
-                        # Increment deletion counter
-                        deletion_count += 1
-
-                        # Delete from source if verified
-                        if self.delete_message(self.source_conn, message_id, dry_run, display_subject, current_index, total_count, deletion_count, source_server):
-                            results['deleted'] += 1
+            to_delete = []
+            current_index = 0
+            trust_label = self._trust_label
+            for batch, message_infos in self._iter_header_batches(self.source_conn, message_ids):
+                migrated_ids = []  # Target UIDs to mark _MIGRATED once the batch is checked
+                if folder_index is not None:
+                    target_index = folder_index
+                else:
+                    try:
+                        # Messages carrying the trust label need no target lookup
+                        target_index = self._prefetch_target_sharded(
+                            target_conns, target_folder,
+                            [info['message_id'] for info in message_infos.values()
+                             if trust_label not in info.get('labels', ())], target_server)
+                    except Exception as e:
+                        self.logger.warning("Bulk target verification failed: %s, verifying messages individually", e)
+                        target_index = None
+
+                for message_id in batch:
+                    current_index += 1
+                    try:
+                        # Get message info from source
+                        message_info = message_infos.get(message_id)
+                        if message_info is None:
+                            raise Exception(f"Failed to fetch message {message_id}")
+                        # Display Unicode characters properly in logging
+                        display_subject = message_info['subject'][:50] if message_info['subject'] else '[No Subject]'
+                        self.logger.info("[%d/%d] Processing: %s...", current_index, total_count, display_subject)
+
+                        # Verify message exists in target
+                        self.logger.debug("Verifying message in target: Message-ID=%s, Subject=%s", message_info.get('message_id', 'None'), message_info.get('subject', 'None')[:30])
+                        trusted = bool(trust_label) and trust_label in message_info.get('labels', ())
+                        if trusted:
+                            target_message_id = ''
+                            verified = True
+                        elif target_index is not None:
+                            target_message_id = target_index.get(self._clean_message_id(message_info['message_id']), '')
+                            verified = bool(target_message_id)
                         else:
-                            results['errors'] += 1
-                    else:
-                        self.logger.warning(f"Message not found in target mailbox - skipping deletion")
-
-                except Exception as e:
-                    self.logger.error(f"Error processing message {message_id.decode()}: {e}")
-                    results['errors'] += 1
+                            target_message_id = ''
+                            verified = self.verify_message_exists(self.target_conn, target_folder, message_info, target_server)
+
+                        if verified:
+                            results['verified'] += 1
+                            if trusted:
+                                self.logger.info("Message carries the %s label - skipping target verification", trust_label)
+                            else:
+                                self.logger.info("Message verified in target mailbox")
+
+                                # Apply _MIGRATED marker to target mailbox for verification
+                                if target_message_id:
+                                    migrated_ids.append(target_message_id)
+                                else:
+                                    self._apply_migrated_marker(self.target_conn, message_info, target_server,
+                                                                target_folder)
+
+                            # Increment deletion counter
+                            deletion_count += 1
+                            to_delete.append((message_id, display_subject, current_index, deletion_count))
+                        else:
+                            self.logger.warning("Message not found in target mailbox - skipping deletion")
+
+                    except Exception as e:
+                        self.logger.error("Error processing message %s: %s", message_id, e)
+                        results['errors'] += 1
+
+                # Mark every message found by the bulk search with one command
+                if migrated_ids:
+                    self._apply_migrated_marker(self.target_conn, {}, target_server, target_folder,
+                                                _compact_uid_set(migrated_ids))
+
+            # Delete verified messages from source once the background fetches are done.
+            # When every searched message was verified and the server saved the
+            # search result, "$" refers to exactly those messages.
+            if (to_delete and len(to_delete) == total_count
+                    and self._saved_search_conn is self.source_conn
+                    and self._delete_saved_search(dry_run, source_server)):
+                results['deleted'] += len(to_delete)
+            elif to_delete:
+                deleted = self.delete_messages(self.source_conn, to_delete, dry_run, total_count, source_server)
+                results['deleted'] += deleted
+                results['errors'] += len(to_delete) - deleted
+
+            # Remember what was processed; if some deletions failed, re-check
+            # every message next run rather than guessing which ones
+            if not dry_run:
+                removed_ids = [message_id for message_id, _, _, _ in to_delete]
+                if results['deleted'] < len(removed_ids):
+                    removed_ids = []
+                self._record_uid_cache(message_ids, removed_ids)
 
             # Expunge deleted messages
             if not dry_run and results['deleted'] > 0:
-                self.source_conn.expunge()
-                self.logger.info(f"Expunged {results['deleted']} deleted messages")
+                self.expunge_messages(self.source_conn, [message_id for message_id, _, _, _ in to_delete])
+                self.logger.info("Expunged %s deleted messages", results['deleted'])
 
             return results
 
         except Exception as e:
-            self.logger.error(f"Sync failed: {e}")
+            self.logger.error("Sync failed: %s", e)
             results['errors'] += 1
+            # Start the next cycle from fresh connections
+            keep_connections = False
             return results
 
         finally:
-            # Close connections
-            if self.source_conn:
-                try:
-                    self.source_conn.close()
-                    self.source_conn.logout()
-                except:
-                    pass
-
-            if self.target_conn:
-                try:
-                    self.target_conn.close()
-                    self.target_conn.logout()
-                except:
-                    pass
-
-
-def main():
-    """Main entry point."""
+            # Every cycle uses the source and target connections; the extra
+            # target connections are stamped when opened or sent a NOOP
+            now = time.monotonic()
+            for conn in (self.source_conn, self.target_conn):
+                if conn is not None:
+                    self._last_activity[conn] = now
+            if not keep_connections:
+                self.close_connections()
+            _flush_logs()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the command-line argument parser."""
     parser = argparse.ArgumentParser(description='Sync emails between IMAP mailboxes')
     parser.add_argument('--config', default='config.json',
                        help='Configuration file path (default: config.json)')
@@ -776,7 +2047,16 @@ def main():
                        help='Perform a dry run without deleting emails')
     parser.add_argument('--skip-venv-check', action='store_true',
                        help='Skip virtual environment check')
+    parser.add_argument('--daemon', action='store_true',
+                       help='Keep running and sync repeatedly, reusing the IMAP connections')
+    parser.add_argument('--interval', type=int, default=300,
+                       help='Seconds between sync cycles in daemon mode (default: 300)')
+    return parser
 
+
+def main():
+    """Main entry point."""
+    parser = build_parser()
     args = parser.parse_args()
 
     try:
@@ -784,16 +2064,20 @@ def main():
         if not args.skip_venv_check:
             check_virtual_environment()
 
-        # Initialize and run sync
-        sync = IMAPSync(args.config)
+        # Initialize and run sync; the connections are closed when the block exits
+        with IMAPSync(args.config) as sync:
+            # Check if dry_run is set in config
+            dry_run = args.dry_run or sync.config.get('dry_run', False)
 
-        # Check if dry_run is set in config
-        dry_run = args.dry_run or sync.config.get('dry_run', False)
+            if dry_run:
+                print("Running in DRY RUN mode - no emails will be deleted")
 
-        if dry_run:
-            print("Running in DRY RUN mode - no emails will be deleted")
+            if args.daemon:
+                print(f"Running in daemon mode - syncing every {args.interval} seconds (Ctrl+C to stop)")
+                sync.run_forever(args.interval, dry_run)
+                return
 
-        results = sync.run_sync(dry_run)
+            results = sync.run_sync(dry_run)
 
         # Print summary
         print("\n" + "="*50)
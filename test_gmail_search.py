@@ -5,10 +5,10 @@ Test Gmail search functionality without requiring actual Gmail connection.
 
 import unittest
 from unittest.mock import Mock, patch, MagicMock
-import json
+from json_compat import dumps
 import tempfile
 import os
-from sync_mail import IMAPSync, is_gmail_server
+from sync_mail import IMAPSync, build_imap_search, is_gmail_server, _find_all_mail_folder
 
 
 class TestGmailSearch(unittest.TestCase):
@@ -79,6 +79,38 @@ class TestGmailSearch(unittest.TestCase):
         self.assertFalse(is_gmail_server("imap.yahoo.com"))
         self.assertFalse(is_gmail_server("mail.example.com"))
     
+    def test_build_imap_search(self):
+        """Test standard IMAP search string construction."""
+        self.assertEqual(build_imap_search({}), 'ALL')
+        self.assertEqual(build_imap_search({"gmail_query": "label:work"}), 'ALL')
+        self.assertEqual(build_imap_search({"subject": "Test Email"}), 'SUBJECT "Test Email"')
+        self.assertEqual(
+            build_imap_search(self.standard_config['search_criteria']),
+            'SUBJECT "Test Email" FROM "sender@example.com" SINCE "01-Jan-2024"'
+        )
+        self.assertEqual(build_imap_search({"subject": "", "larger": "1024", "smaller": 4096}),
+                         'LARGER 1024 SMALLER 4096')
+    
+    def test_find_all_mail_folder(self):
+        """Test finding the localized All Mail folder from its \\All attribute."""
+        mock_conn = Mock()
+        mock_conn.list.return_value = ('OK', [
+            b'(\\HasNoChildren) "/" "INBOX"',
+            b'(\\HasNoChildren \\All) "/" "[Google Mail]/Alle Nachrichten"',
+            b'(\\HasNoChildren \\Trash) "/" "[Google Mail]/Papierkorb"',
+        ])
+        self.assertEqual(_find_all_mail_folder(mock_conn), '"[Google Mail]/Alle Nachrichten"')
+        
+        mock_conn.list.return_value = ('OK', [b'(\\HasNoChildren) "/" "INBOX"'])
+        self.assertEqual(_find_all_mail_folder(mock_conn), '')
+        
+        # With SPECIAL-USE only the special-use folders are requested
+        mock_conn.capabilities = ('IMAP4REV1', 'SPECIAL-USE')
+        mock_conn._simple_command.return_value = ('OK', [None])
+        mock_conn._untagged_response.return_value = ('OK', [b'(\\HasNoChildren \\All) "/" "[Gmail]/All Mail"'])
+        self.assertEqual(_find_all_mail_folder(mock_conn), '"[Gmail]/All Mail"')
+        mock_conn._simple_command.assert_called_once_with('LIST', '(SPECIAL-USE)', '""', '*')
+    
     @patch('sync_mail.imaplib.IMAP4_SSL')
     def test_gmail_search_functionality(self, mock_imap):
         """Test Gmail X-GM-RAW search functionality."""
@@ -89,11 +121,11 @@ class TestGmailSearch(unittest.TestCase):
         mock_conn.select.return_value = ('OK', None)
         
         # Mock successful Gmail search
-        mock_conn.search.return_value = ('OK', [b'1 2 3'])
+        mock_conn.uid.return_value = ('OK', [b'1 2 3'])
         
         # Create temporary config file
         with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
-            json.dump(self.gmail_config, f)
+            f.write(dumps(self.gmail_config))
             config_file = f.name
         
         try:
@@ -110,11 +142,11 @@ class TestGmailSearch(unittest.TestCase):
                 messages = sync.search_emails(mock_conn, "INBOX", criteria, "imap.gmail.com")
                 
                 # Verify Gmail search was called
-                mock_conn.search.assert_called_with(None, 'X-GM-RAW', '"from:test@example.com after:2024/1/1"')
+                mock_conn.uid.assert_called_with('SEARCH', 'X-GM-RAW', '"from:test@example.com after:2024/1/1"')
                 
                 # Verify results
                 self.assertEqual(len(messages), 3)
-                self.assertEqual(messages, [b'1', b'2', b'3'])
+                self.assertEqual(messages, [1, 2, 3])
                 
         finally:
             os.unlink(config_file)
@@ -129,14 +161,14 @@ class TestGmailSearch(unittest.TestCase):
         mock_conn.select.return_value = ('OK', None)
         
         # Mock Gmail search failure, then standard search success
-        mock_conn.search.side_effect = [
+        mock_conn.uid.side_effect = [
             ('NO', []),  # Gmail search fails
             ('OK', [b'4 5'])  # Standard search succeeds
         ]
         
         # Create temporary config file
         with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
-            json.dump(self.gmail_config, f)
+            f.write(dumps(self.gmail_config))
             config_file = f.name
         
         try:
@@ -156,11 +188,11 @@ class TestGmailSearch(unittest.TestCase):
                 messages = sync.search_emails(mock_conn, "INBOX", criteria, "imap.gmail.com")
                 
                 # Verify both searches were attempted
-                self.assertEqual(mock_conn.search.call_count, 2)
+                self.assertEqual(mock_conn.uid.call_count, 2)
                 
                 # Verify fallback results
                 self.assertEqual(len(messages), 2)
-                self.assertEqual(messages, [b'4', b'5'])
+                self.assertEqual(messages, [4, 5])
                 
         finally:
             os.unlink(config_file)
@@ -173,11 +205,11 @@ class TestGmailSearch(unittest.TestCase):
         mock_imap.return_value = mock_conn
         mock_conn.login.return_value = None
         mock_conn.select.return_value = ('OK', None)
-        mock_conn.search.return_value = ('OK', [b'6 7 8 9'])
+        mock_conn.uid.return_value = ('OK', [b'6 7 8 9'])
         
         # Create temporary config file
         with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
-            json.dump(self.standard_config, f)
+            f.write(dumps(self.standard_config))
             config_file = f.name
         
         try:
@@ -193,11 +225,11 @@ class TestGmailSearch(unittest.TestCase):
             
             # Verify standard IMAP search was used
             expected_search = 'SUBJECT "Test Email" FROM "sender@example.com" SINCE "01-Jan-2024"'
-            mock_conn.search.assert_called_with(None, expected_search)
+            mock_conn.uid.assert_called_with('SEARCH', expected_search)
             
             # Verify results
             self.assertEqual(len(messages), 4)
-            self.assertEqual(messages, [b'6', b'7', b'8', b'9'])
+            self.assertEqual(messages, [6, 7, 8, 9])
             
         finally:
             os.unlink(config_file)
@@ -3,13 +3,48 @@
 Test OAuth2 implementation without requiring actual Google credentials.
 """
 
-import unittest
-from unittest.mock import Mock, patch, MagicMock
-import json
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from json_compat import dumps
 import tempfile
 import os
 import sys
 
+# Valid mixed OAuth2/password configuration; tests copy it before changing it
+_VALID_OAUTH2_CONFIG = {
+    "source_mailbox": {
+        "server": "imap.gmail.com",
+        "port": 993,
+        "username": "test@gmail.com",
+        "auth_method": "oauth2",
+        "folder": "INBOX"
+    },
+    "target_mailbox": {
+        "server": "imap.target.com",
+        "port": 993,
+        "username": "target@example.com",
+        "auth_method": "password",
+        "password": "testpass",
+        "folder": "INBOX"
+    }
+}
+
+
+# Show the output of passing tests too: always on a terminal, elsewhere
+# (e.g. CI logs) only with TEST_VERBOSE=1
+_VERBOSE = os.environ.get('TEST_VERBOSE') == '1' or sys.stdout.isatty()
+
+# Public methods OAuth2Helper must provide
+_OAUTH2_HELPER_METHODS = frozenset((
+    'get_oauth2_credentials',
+    'generate_xoauth2_string',
+    'authenticate_imap_oauth2',
+    'is_oauth2_configured',
+    'setup_oauth2_credentials',
+))
+
+
 # Test the OAuth2 implementation structure
 def test_oauth2_structure():
     """Test that OAuth2 classes and methods are properly structured."""
@@ -26,19 +61,11 @@ def test_oauth2_structure():
         print("✓ OAuth2Helper instantiated successfully")
         
         # Test method existence
-        methods = [
-            'get_oauth2_credentials',
-            'generate_xoauth2_string', 
-            'authenticate_imap_oauth2',
-            'is_oauth2_configured',
-            'setup_oauth2_credentials'
-        ]
-        
-        for method in methods:
-            if hasattr(helper, method):
-                print(f"✓ Method {method} exists")
-            else:
-                print(f"✗ Method {method} missing")
+        missing = _OAUTH2_HELPER_METHODS.difference(dir(helper))
+        if missing:
+            print(f"✗ Methods missing: {', '.join(sorted(missing))}")
+            return False
+        print(f"✓ All {len(_OAUTH2_HELPER_METHODS)} OAuth2Helper methods exist")
         
         # Test configuration detection
         configured = helper.is_oauth2_configured()
@@ -58,6 +85,37 @@ def test_oauth2_structure():
         return False
 
 
+def test_xoauth2_string():
+    """Test XOAUTH2 string encoding and reuse."""
+    print("\nTesting XOAUTH2 String Generation...")
+    print("=" * 50)
+    
+    try:
+        import base64
+        from oauth2_helper import OAuth2Helper
+        
+        helper = OAuth2Helper("test_creds.json", "test_token.json")
+        xoauth_str = helper.generate_xoauth2_string("test@gmail.com", "fake_token")
+        expected = base64.b64encode(b'user=test@gmail.com\x01auth=Bearer fake_token\x01\x01').decode()
+        if xoauth_str == expected:
+            print("✓ XOAUTH2 string correctly encoded")
+        else:
+            print(f"✗ Unexpected XOAUTH2 string: {xoauth_str}")
+            return False
+        
+        if helper.generate_xoauth2_string("test@gmail.com", "new_token") != xoauth_str:
+            print("✓ XOAUTH2 string regenerated for a new token")
+        else:
+            print("✗ Stale XOAUTH2 string returned for a new token")
+            return False
+        
+        return True
+        
+    except Exception as e:
+        print(f"✗ Error testing XOAUTH2 string: {e}")
+        return False
+
+
 def test_sync_oauth2_integration():
     """Test that sync_mail.py integrates OAuth2 properly."""
     print("\nTesting Sync Script OAuth2 Integration...")
@@ -90,7 +148,7 @@ def test_sync_oauth2_integration():
         
         # Create temporary config file
         with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
-            json.dump(test_config, f)
+            f.write(dumps(test_config))
             config_file = f.name
         
         try:
@@ -131,23 +189,7 @@ def test_config_validation():
         from config_helper import validate_config
         
         # Test valid OAuth2 config
-        valid_oauth2_config = {
-            "source_mailbox": {
-                "server": "imap.gmail.com",
-                "port": 993,
-                "username": "test@gmail.com",
-                "auth_method": "oauth2",
-                "folder": "INBOX"
-            },
-            "target_mailbox": {
-                "server": "imap.target.com",
-                "port": 993,
-                "username": "target@example.com",
-                "auth_method": "password",
-                "password": "testpass",
-                "folder": "INBOX"
-            }
-        }
+        valid_oauth2_config = _VALID_OAUTH2_CONFIG
         
         errors = validate_config(valid_oauth2_config)
         if len(errors) == 0:
@@ -155,9 +197,10 @@ def test_config_validation():
         else:
             print(f"✗ Valid OAuth2 config failed validation: {errors}")
         
-        # Test invalid auth method
-        invalid_config = valid_oauth2_config.copy()
-        invalid_config['source_mailbox']['auth_method'] = 'invalid_method'
+        # Test invalid auth method; overrides copy only the mailbox they change,
+        # so the shared valid config is never modified
+        invalid_config = {**valid_oauth2_config,
+                          'source_mailbox': {**valid_oauth2_config['source_mailbox'], 'auth_method': 'invalid_method'}}
         
         errors = validate_config(invalid_config)
         if len(errors) > 0:
@@ -166,9 +209,9 @@ def test_config_validation():
             print("✗ Invalid auth method not detected")
         
         # Test missing password for password auth
-        invalid_config2 = valid_oauth2_config.copy()
-        invalid_config2['target_mailbox']['auth_method'] = 'password'
-        del invalid_config2['target_mailbox']['password']
+        target = valid_oauth2_config['target_mailbox']
+        invalid_config2 = {**valid_oauth2_config,
+                           'target_mailbox': {key: value for key, value in target.items() if key != 'password'}}
         
         errors = validate_config(invalid_config2)
         if len(errors) > 0:
@@ -183,6 +226,30 @@ def test_config_validation():
         return False
 
 
+class _ThreadOutput(io.TextIOBase):
+    """sys.stdout stand-in sending each worker thread's output to its own buffer."""
+    
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local()
+    
+    def write(self, text):
+        return getattr(self._local, 'buffer', self._stream).write(text)
+    
+    def run(self, test):
+        """Run a test with its output captured, returning (passed, output)."""
+        self._local.buffer = io.StringIO()
+        try:
+            try:
+                passed = bool(test())
+            except Exception as e:
+                print(f"✗ Test {test.__name__} failed with exception: {e}")
+                passed = False
+            return passed, self._local.buffer.getvalue()
+        finally:
+            del self._local.buffer
+
+
 def run_all_tests():
     """Run all OAuth2 tests."""
     print("OAuth2 Implementation Test Suite")
@@ -190,19 +257,28 @@ def run_all_tests():
     
     tests = [
         test_oauth2_structure,
+        test_xoauth2_string,
         test_sync_oauth2_integration,
         test_config_validation
     ]
     
-    passed = 0
     total = len(tests)
     
-    for test in tests:
-        try:
-            if test():
-                passed += 1
-        except Exception as e:
-            print(f"✗ Test {test.__name__} failed with exception: {e}")
+    # The tests are independent, so run them concurrently and print each
+    # one's output in order once all have finished
+    stdout = sys.stdout
+    sys.stdout = output = _ThreadOutput(stdout)
+    try:
+        with ThreadPoolExecutor(max_workers=total) as executor:
+            results = list(executor.map(output.run, tests))
+    finally:
+        sys.stdout = stdout
+    
+    # One write for the whole report rather than one per test; when not
+    # verbose only the output of failed tests is shown
+    stdout.write(''.join(test_output for test_passed, test_output in results
+                         if _VERBOSE or not test_passed))
+    passed = sum(test_passed for test_passed, _ in results)
     
     print("\n" + "=" * 60)
     print(f"Test Results: {passed}/{total} tests passed")
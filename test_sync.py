@@ -4,21 +4,54 @@ Test script for the email sync functionality.
 This script tests the core functionality without requiring real IMAP credentials.
 """
 
+import copy
+import imaplib
+import io
+import logging.handlers
+import queue
+import ssl
 import unittest
-from unittest.mock import Mock, patch, MagicMock
-import json
+import zlib
+from contextlib import redirect_stdout
+from unittest.mock import ANY, Mock, patch, MagicMock
+from json_compat import dumps, loads
 import tempfile
 import os
-from sync_mail import IMAPSync
-from config_helper import validate_config, create_sample_config
+import sync_mail
+from sync_mail import (IMAPSync, _compact_uid_set, _enable_compression, _expand_sequence_set, _get_ssl_context,
+                       _parse_headers, _search_arguments, build_imap_search)
+from uid_cache import UIDCache
+import config_helper
+from config_helper import validate_config, validate_config_file, create_sample_config, write_config
+
+
+# The real class, kept as a spec for connection mocks; TestEmailSync patches
+# imaplib.IMAP4_SSL itself while it runs
+_IMAP4_SSL = imaplib.IMAP4_SSL
+
+
+class _OfflineIMAP4(imaplib.IMAP4):
+    """imaplib.IMAP4 initialized without a server, with the given capabilities."""
+    
+    def __init__(self, capabilities):
+        self._capabilities = capabilities
+        super().__init__()
+    
+    def open(self, host='', port=imaplib.IMAP4_PORT, timeout=None):
+        pass
+    
+    def _connect(self):
+        self.capabilities = self._capabilities
+        self.state = 'AUTH'
 
 
 class TestEmailSync(unittest.TestCase):
     """Test cases for email sync functionality."""
     
-    def setUp(self):
-        """Set up test fixtures."""
-        self.test_config = {
+    @classmethod
+    def setUpClass(cls):
+        """Write the shared configuration file once for the whole class."""
+        cls.base_config = {
             "source_mailbox": {
                 "server": "test.server.com",
                 "port": 993,
@@ -40,14 +73,33 @@ class TestEmailSync(unittest.TestCase):
             "dry_run": True
         }
         
-        # Create temporary config file
-        self.temp_config = tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False)
-        json.dump(self.test_config, self.temp_config)
-        self.temp_config.close()
+        # Create temporary config file; tests that need a different file
+        # write their own with _write_temp_config
+        cls.temp_config = tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False)
+        cls.temp_config.write(dumps(cls.base_config))
+        cls.temp_config.close()
+        
+        # No test may open a real connection; the patcher is started once for the class
+        imap_patcher = patch('sync_mail.imaplib.IMAP4_SSL')
+        cls.mock_imap = imap_patcher.start()
+        cls.addClassCleanup(imap_patcher.stop)
+    
+    @classmethod
+    def tearDownClass(cls):
+        """Clean up the shared configuration file."""
+        os.unlink(cls.temp_config.name)
+    
+    def setUp(self):
+        """Give each test its own copy of the configuration and a fresh IMAP4_SSL mock."""
+        self.test_config = copy.deepcopy(self.base_config)
+        self.mock_imap.reset_mock(return_value=True, side_effect=True)
     
-    def tearDown(self):
-        """Clean up test fixtures."""
-        os.unlink(self.temp_config.name)
+    def _write_temp_config(self, config: dict) -> str:
+        """Write config to a temporary file removed after the test, returning its path."""
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
+            f.write(dumps(config))
+        self.addCleanup(os.unlink, f.name)
+        return f.name
     
     def test_config_validation(self):
         """Test configuration validation."""
@@ -56,63 +108,674 @@ class TestEmailSync(unittest.TestCase):
         self.assertEqual(len(errors), 0)
         
         # Invalid config should fail
-        invalid_config = self.test_config.copy()
-        del invalid_config['source_mailbox']['username']
+        source = self.test_config['source_mailbox']
+        invalid_config = {**self.test_config,
+                          'source_mailbox': {key: value for key, value in source.items() if key != 'username'}}
         errors = validate_config(invalid_config)
         self.assertGreater(len(errors), 0)
     
+    def test_config_validation_cache(self):
+        """Test that cached validation results are not shared between callers."""
+        invalid_config = dict(self.test_config, log_level="LOUD")
+        errors = validate_config(invalid_config)
+        self.assertEqual(len(errors), 1)
+        errors.clear()
+        self.assertEqual(len(validate_config(dict(invalid_config))), 1)
+        # Key order does not matter
+        self.assertEqual(validate_config(dict(reversed(list(invalid_config.items())))), validate_config(invalid_config))
+    
     def test_config_loading(self):
         """Test configuration file loading."""
         sync = IMAPSync(self.temp_config.name)
         self.assertEqual(sync.config['source_mailbox']['server'], 'test.server.com')
         self.assertEqual(sync.config['target_mailbox']['server'], 'target.server.com')
     
+    def test_config_validation_wrong_types(self):
+        """Test that wrongly typed sections are reported instead of raising."""
+        config = dict(self.test_config, source_mailbox="imap.example.com", log_level=10)
+        errors = validate_config(config)
+        self.assertIn("source_mailbox must be an object", errors)
+        self.assertTrue(any(error.startswith("log_level must be a string") for error in errors))
+        
+        config = dict(self.test_config, search_criteria={'larger': '10MB', 'smaller': -1})
+        errors = validate_config(config)
+        self.assertIn("larger must be a number of bytes in search_criteria", errors)
+        self.assertIn("Invalid smaller in search_criteria: -1", errors)
+        
+        config = dict(self.test_config, search_criteria="from:sender@example.com")
+        self.assertIn("search_criteria must be an object", validate_config(config))
+    
+    def test_config_file_validation(self):
+        """Test validation of a configuration file on disk."""
+        self.assertEqual(validate_config_file(self.temp_config.name), [])
+        # Repeated validation of the unchanged file gives the same result
+        self.assertEqual(validate_config_file(self.temp_config.name), [])
+
+        with self.assertRaises(FileNotFoundError):
+            validate_config_file(self.temp_config.name + '.missing')
+
+    def test_config_load_cache(self):
+        """Test that an unchanged config file is parsed once and an edited one again."""
+        config_file = self._write_temp_config(self.test_config)
+        first = IMAPSync(config_file).config
+        self.assertIs(IMAPSync(config_file).config, first)
+        
+        with open(config_file, 'w') as f:
+            f.write(dumps(dict(self.test_config, log_level="DEBUG")))
+        self.assertEqual(IMAPSync(config_file).config['log_level'], 'DEBUG')
+
+    def test_validate_command_stamp(self):
+        """Test that the validate command skips unchanged, already valid files."""
+        config_file = self._write_temp_config(self.test_config)
+        stamp_file = config_helper._validated_stamp_path(config_file)
+        self.addCleanup(lambda: os.path.exists(stamp_file) and os.unlink(stamp_file))
+        
+        for expected in ("is valid!", "is valid (cached)"):
+            output = io.StringIO()
+            with redirect_stdout(output):
+                config_helper.main(['validate', config_file])
+            self.assertIn(expected, output.getvalue())
+        
+        # A stamp written by a different version of the validator is ignored
+        output = io.StringIO()
+        with redirect_stdout(output), patch('config_helper._validator_hash', return_value='0' * 16):
+            config_helper.main(['validate', config_file])
+        self.assertIn("is valid!", output.getvalue())
+        
+        # Any change to the file invalidates the stamp
+        with open(config_file, 'w') as f:
+            f.write(dumps({"source_mailbox": {}}))
+        with redirect_stdout(io.StringIO()), self.assertRaises(SystemExit):
+            config_helper.main(['validate', config_file])
+    
     def test_sample_config_creation(self):
         """Test sample configuration creation."""
         sample = create_sample_config()
         errors = validate_config(sample)
         self.assertEqual(len(errors), 0)
     
-    @patch('sync_mail.imaplib.IMAP4_SSL')
-    def test_imap_connection(self, mock_imap):
+    def test_write_config(self):
+        """Test that written configuration files round-trip."""
+        sample = create_sample_config()
+        config_file = self._write_temp_config({})
+        write_config(config_file, sample)
+        with open(config_file, 'r') as f:
+            self.assertEqual(loads(f.read()), sample)
+    
+    def test_imap_connection(self):
         """Test IMAP connection handling."""
         # Setup mock
-        mock_conn = Mock()
-        mock_imap.return_value = mock_conn
+        mock_conn = Mock(spec=_IMAP4_SSL, sock=Mock(), capabilities=('IMAP4REV1',))
+        self.mock_imap.return_value = mock_conn
         mock_conn.login.return_value = None
         
         # Test connection
-        sync = IMAPSync(self.temp_config.name)
+        sync = IMAPSync(self.test_config)
         conn = sync.connect_imap(self.test_config['source_mailbox'])
         
         # Verify calls
-        mock_imap.assert_called_once_with('test.server.com', 993)
+        self.mock_imap.assert_called_once_with('test.server.com', 993, ssl_context=ANY)
         mock_conn.login.assert_called_once_with('test@example.com', 'testpass')
         self.assertEqual(conn, mock_conn)
     
-    @patch('sync_mail.imaplib.IMAP4_SSL')
-    def test_email_search(self, mock_imap):
+    def test_flush_logs(self):
+        """Test that _flush_logs waits for queued records and the listener can be stopped twice."""
+        handler = Mock()
+        log_queue = queue.Queue()
+        listener = logging.handlers.QueueListener(log_queue, handler)
+        listener.start()
+        with patch('sync_mail._log_listener', listener):
+            record = logging.makeLogRecord({'msg': 'queued'})
+            log_queue.put(record)
+            sync_mail._flush_logs()
+            handler.handle.assert_called_once_with(record)
+            sync_mail._stop_log_listener()
+            sync_mail._stop_log_listener()
+            self.assertIsNone(sync_mail._log_listener)
+    
+    def test_ssl_context_resumes_sessions(self):
+        """Test that reconnects to a server offer its saved TLS session."""
+        context = _get_ssl_context()
+        self.assertIs(context, _get_ssl_context())
+        self.assertEqual(context.verify_mode, ssl.CERT_NONE)
+        session = Mock()
+        raw_sock = Mock()
+        with patch.dict(context.sessions, {'test.server.com': session}), \
+                patch('ssl.SSLContext.wrap_socket') as wrap_socket:
+            context.wrap_socket(raw_sock, server_hostname='test.server.com')
+            context.wrap_socket(raw_sock, server_hostname='other.server.com')
+        wrap_socket.assert_any_call(raw_sock, server_hostname='test.server.com', session=session)
+        wrap_socket.assert_any_call(raw_sock, server_hostname='other.server.com', session=None)
+    
+    def test_email_search(self):
         """Test email search functionality."""
         # Setup mock
-        mock_conn = Mock()
-        mock_imap.return_value = mock_conn
+        mock_conn = Mock(spec=_IMAP4_SSL, sock=Mock(), capabilities=('IMAP4REV1',))
+        self.mock_imap.return_value = mock_conn
         mock_conn.login.return_value = None
         mock_conn.select.return_value = ('OK', None)
-        mock_conn.search.return_value = ('OK', [b'1 2 3'])
+        mock_conn.uid.return_value = ('OK', [b'1 2 3'])
         
         # Test search
-        sync = IMAPSync(self.temp_config.name)
+        sync = IMAPSync(self.test_config)
         conn = sync.connect_imap(self.test_config['source_mailbox'])
         messages = sync.search_emails(conn, 'INBOX', {'subject': 'Test'})
         
         # Verify results
         self.assertEqual(len(messages), 3)
-        self.assertEqual(messages, [b'1', b'2', b'3'])
-        mock_conn.search.assert_called_once()
+        self.assertEqual(messages, [1, 2, 3])
+        mock_conn.uid.assert_called_once_with('SEARCH', 'SUBJECT "Test"')
+    
+    def test_bulk_header_fetch(self):
+        """Test fetching headers for several messages in one command."""
+        mock_conn = Mock()
+        mock_conn.uid.return_value = ('OK', [
+            (b'1 (UID 11 BODY[HEADER.FIELDS (SUBJECT FROM MESSAGE-ID DATE)] {52}',
+             b'Subject: First\r\nMessage-ID: <one@example.com>\r\n\r\n'),
+            b')',
+            (b'2 (UID 12 BODY[HEADER.FIELDS (SUBJECT FROM MESSAGE-ID DATE)] {53}',
+             b'Subject: Second\r\nMessage-ID: <two@example.com>\r\n\r\n'),
+            b')',
+        ])
+        
+        sync = IMAPSync(self.test_config)
+        infos = sync.get_message_infos(mock_conn, [11, 12])
+        
+        mock_conn.uid.assert_called_once()
+        command, message_set, items = mock_conn.uid.call_args[0]
+        self.assertEqual((command, message_set), ('FETCH', '11:12'))
+        self.assertIn('BODY.PEEK', items)
+        self.assertEqual(infos[11]['subject'], 'First')
+        self.assertEqual(infos[12]['message_id'], '<two@example.com>')
+    
+    def test_single_header_fetch(self):
+        """Test fetching one message's header fields without the full header."""
+        mock_conn = Mock()
+        mock_conn.uid.return_value = ('OK', [
+            (b'1 (UID 11 BODY[HEADER.FIELDS (SUBJECT FROM MESSAGE-ID DATE)] {52}',
+             b'Subject: First\r\nMessage-ID: <one@example.com>\r\n\r\n'),
+            b')',
+        ])
+        
+        sync = IMAPSync(self.test_config)
+        info = sync.get_message_info(mock_conn, 11)
+        
+        mock_conn.uid.assert_called_once_with('FETCH', '11', '(BODY.PEEK[HEADER.FIELDS (SUBJECT FROM MESSAGE-ID DATE)])')
+        self.assertEqual(info['message_id'], '<one@example.com>')
+    
+    def test_run_sync_deletes_verified_messages(self):
+        """Test that only messages found in the target are deleted from the source."""
+        headers = {
+            1: b'Subject: Synced\r\nMessage-ID: <synced@example.com>\r\n\r\n',
+            2: b'Subject: Missing\r\nMessage-ID: <missing@example.com>\r\n\r\n',
+        }
+        
+        def source_uid(command, *args):
+            if command == 'SEARCH':
+                return 'OK', [b'1 2']
+            if command == 'FETCH':
+                data = []
+                for message_id in _expand_sequence_set(args[0].encode()):
+                    data.append((b'%d (UID %d BODY[HEADER] {10}' % (message_id, message_id), headers[message_id]))
+                    data.append(b')')
+                return 'OK', data
+            return 'OK', []
+        
+        def target_uid(command, *args):
+            if command == 'SEARCH':
+                return 'OK', [b'7' if 'synced@example.com' in ' '.join(args) else b'']
+            if command == 'FETCH':
+                return 'OK', [(b'3 (UID 7 BODY[HEADER] {10}', b'Message-ID: <synced@example.com>\r\n\r\n'), b')']
+            return 'OK', []
+        
+        source_conn = Mock()
+        source_conn.select.return_value = ('OK', [b'2'])
+        source_conn.uid.side_effect = source_uid
+        target_conn = Mock()
+        target_conn.select.return_value = ('OK', [b'1'])
+        target_conn.uid.side_effect = target_uid
+        
+        sync = IMAPSync(self.test_config)
+        # Both connections are opened concurrently, so pick the mock by mailbox
+        connections = {'test.server.com': source_conn, 'target.server.com': target_conn}
+        with patch.object(sync, 'connect_imap', side_effect=lambda config: connections[config['server']]):
+            results = sync.run_sync(dry_run=False)
+        
+        self.assertEqual(results, {'processed': 2, 'verified': 1, 'deleted': 1, 'errors': 0})
+        source_conn.uid.assert_any_call('STORE', '1', '+FLAGS.SILENT', '\\Deleted')
+        # Headers for both messages came from one FETCH of the UID range
+        source_conn.uid.assert_any_call('FETCH', '1:2', ANY)
+        self.assertEqual(len([call for call in source_conn.uid.call_args_list if call[0][0] == 'FETCH']), 1)
+        for call in source_conn.uid.call_args_list:
+            if call[0][0] == 'STORE':
+                self.assertNotIn('2', call[0][1].split(','))
+        source_conn.expunge.assert_called_once()
+        # Both Message-IDs were checked with a single target search
+        target_searches = [call for call in target_conn.uid.call_args_list if call[0][0] == 'SEARCH']
+        self.assertEqual(len(target_searches), 1)
+    
+    def test_run_sync_marks_batch_migrated(self):
+        """Test that target messages found by the bulk search are marked with one command."""
+        source_conn = Mock()
+        source_conn.uid.return_value = ('OK', [
+            (b'1 (UID 1 BODY[HEADER] {10}', b'Message-ID: <a@example.com>\r\n\r\n'), b')',
+            (b'2 (UID 2 BODY[HEADER] {10}', b'Message-ID: <b@example.com>\r\n\r\n'), b')',
+        ])
+        target_conn = Mock()
+        target_conn.uid.return_value = ('OK', [None])
+        
+        sync = IMAPSync(self.test_config)
+        target_index = {sync._clean_message_id('<a@example.com>'): 7, sync._clean_message_id('<b@example.com>'): 8}
+        connections = {'test.server.com': source_conn, 'target.server.com': target_conn}
+        with patch.object(sync, 'connect_imap', side_effect=lambda config: connections[config['server']]), \
+                patch.object(sync, 'search_emails', return_value=[1, 2]), \
+                patch.object(sync, 'prefetch_target_message_ids', return_value=target_index):
+            results = sync.run_sync(dry_run=False)
+        
+        self.assertEqual(results, {'processed': 2, 'verified': 2, 'deleted': 2, 'errors': 0})
+        target_conn.uid.assert_called_once_with('COPY', '7:8', '_MIGRATED')
+    
+    def test_run_sync_uses_target_index(self):
+        """Test that a configured target index replaces the per-batch target search."""
+        self.test_config['target_index'] = True
+        
+        source_conn = Mock()
+        source_conn.uid.return_value = ('OK', [
+            (b'1 (UID 1 BODY[HEADER] {10}', b'Message-ID: <a@example.com>\r\n\r\n'), b')',
+        ])
+        target_conn = Mock()
+        target_conn.uid.return_value = ('OK', [None])
+        
+        sync = IMAPSync(self.test_config)
+        connections = {'test.server.com': source_conn, 'target.server.com': target_conn}
+        with patch.object(sync, 'connect_imap', side_effect=lambda config: connections[config['server']]), \
+                patch.object(sync, 'search_emails', return_value=[1]), \
+                patch.object(sync, 'build_target_index', return_value={'a@example.com': 7}) as build_index, \
+                patch.object(sync, 'prefetch_target_message_ids') as prefetch:
+            results = sync.run_sync(dry_run=False)
+        
+        self.assertEqual(results, {'processed': 1, 'verified': 1, 'deleted': 1, 'errors': 0})
+        build_index.assert_called_once_with(target_conn, 'INBOX', 'target.server.com', '')
+        prefetch.assert_not_called()
+    
+    def test_run_sync_trusts_gmail_label(self):
+        """Test that messages carrying the trust label skip the target lookup."""
+        self.test_config['source_mailbox']['server'] = 'imap.gmail.com'
+        self.test_config['trust_label'] = '\\Archived'
+        
+        source_conn = Mock()
+        source_conn.uid.return_value = ('OK', [
+            (b'1 (X-GM-LABELS ("\\\\Archived" Work) UID 5 BODY[HEADER.FIELDS (SUBJECT FROM MESSAGE-ID DATE)] {40}',
+             b'Subject: Old\r\nMessage-ID: <old@example.com>\r\n\r\n'),
+            b')',
+        ])
+        target_conn = Mock()
+        
+        sync = IMAPSync(self.test_config)
+        connections = {'imap.gmail.com': source_conn, 'target.server.com': target_conn}
+        with patch.object(sync, 'connect_imap', side_effect=lambda config: connections[config['server']]), \
+                patch.object(sync, 'search_emails', return_value=[5]):
+            results = sync.run_sync(dry_run=False)
+        
+        self.assertEqual(results, {'processed': 1, 'verified': 1, 'deleted': 1, 'errors': 0})
+        self.assertIn('X-GM-LABELS', source_conn.uid.call_args_list[0][0][2])
+        source_conn.uid.assert_any_call('STORE', '5', '+FLAGS.SILENT', '\\Deleted')
+        target_conn.uid.assert_not_called()
+    
+    def test_expunge_messages_uidplus(self):
+        """Test that only the deleted UIDs are expunged when UIDPLUS is available."""
+        sync = IMAPSync(self.test_config)
+        conn = Mock()
+        conn.capabilities = ('IMAP4REV1', 'UIDPLUS')
+        conn.uid.return_value = ('OK', [None])
+        
+        sync.expunge_messages(conn, [3, 4, 5, 9])
+        conn.uid.assert_called_once_with('EXPUNGE', '3:5,9')
+        conn.expunge.assert_not_called()
+        
+        conn.capabilities = ('IMAP4REV1',)
+        sync.expunge_messages(conn, [3])
+        conn.expunge.assert_called_once()
+    
+    def test_search_emails_searchres(self):
+        """Test that SEARCHRES servers save the search result and return ESEARCH IDs."""
+        conn = Mock()
+        conn.capabilities = ('IMAP4REV1', 'ESEARCH', 'SEARCHRES')
+        conn.select.return_value = ('OK', [b'9'])
+        conn._simple_command.return_value = ('OK', [b'Search completed'])
+        conn._untagged_response.return_value = ('OK', [b'(TAG "A5") ALL 2:4,9'])
+        
+        sync = IMAPSync(self.test_config)
+        message_ids = sync.search_emails(conn, 'INBOX', {'subject': 'Test'})
+        
+        self.assertEqual(message_ids, [2, 3, 4, 9])
+        conn._simple_command.assert_called_once_with('UID', 'SEARCH', 'RETURN', '(SAVE ALL)', 'SUBJECT "Test"')
+        conn.uid.assert_not_called()
+        self.assertIs(sync._saved_search_conn, conn)
+        
+        # A later Gmail search that succeeds does not replace "$", so it must not be trusted
+        conn.uid.return_value = ('OK', [b'5'])
+        message_ids = sync.search_emails(conn, 'INBOX', {'gmail_query': 'label:old'}, 'imap.gmail.com')
+        self.assertEqual(message_ids, [5])
+        self.assertIsNone(sync._saved_search_conn)
+    
+    def test_uid_cache_restricts_search(self):
+        """Test that cached folders only search pending and new UIDs."""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache_file = os.path.join(cache_dir, 'uidcache.json')
+            cache = UIDCache(cache_file)
+            cache.update('key', 7, 20, [5])
+            cache.save()
+            
+            conn = Mock()
+            conn.select.return_value = ('OK', [b'30'])
+            conn.response.return_value = ('UIDVALIDITY', [b'7'])
+            conn.uid.return_value = ('OK', [b'5 12 21 22'])
+            
+            sync = IMAPSync(self.test_config)
+            sync.uid_cache = UIDCache(cache_file)
+            message_ids = sync.search_emails(conn, 'INBOX', {'subject': 'Test'}, cache_key='key')
+            
+            conn.uid.assert_called_once_with('SEARCH', 'UID 5,21:* SUBJECT "Test"')
+            self.assertEqual(message_ids, [5, 21, 22])
+            
+            # 21 was deleted; 5 and 22 stay pending for the next run
+            sync._record_uid_cache(message_ids, [21])
+            self.assertEqual(UIDCache(cache_file).get('key', 7), (22, [5, 22], 0))
+            self.assertIsNone(UIDCache(cache_file).get('key', 8))
+    
+    def test_uid_cache_skips_age_queries(self):
+        """Test that Gmail queries matching by message age search the whole folder."""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache_file = os.path.join(cache_dir, 'uidcache.json')
+            cache = UIDCache(cache_file)
+            cache.update('key', 7, 20, [5])
+            cache.save()
+            
+            conn = Mock()
+            conn.select.return_value = ('OK', [b'30'])
+            conn.response.return_value = ('UIDVALIDITY', [b'7'])
+            conn.uid.return_value = ('OK', [b'3 5 21'])
+            conn._allmail_folder = ''
+            
+            sync = IMAPSync(self.test_config)
+            sync.uid_cache = UIDCache(cache_file)
+            message_ids = sync.search_emails(conn, 'INBOX', {'gmail_query': 'older_than:1y'}, 'imap.gmail.com',
+                                             cache_key='key')
+            
+            conn.uid.assert_called_once_with('SEARCH', 'X-GM-RAW', '"older_than:1y"')
+            self.assertEqual(message_ids, [3, 5, 21])
+            self.assertIsNone(sync._uid_cache_state)
+    
+    def test_uid_cache_condstore_search(self):
+        """Test that CONDSTORE servers search pending UIDs and messages changed since the last run."""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache_file = os.path.join(cache_dir, 'uidcache.json')
+            cache = UIDCache(cache_file)
+            cache.update('key', 7, 20, [5], 900)
+            cache.save()
+            
+            conn = Mock()
+            conn.capabilities = ('IMAP4REV1', 'CONDSTORE')
+            conn.select.return_value = ('OK', [b'30'])
+            conn.response.side_effect = lambda code: (code, [b'7' if code == 'UIDVALIDITY' else b'950'])
+            conn.uid.return_value = ('OK', [b'3 5 21'])
+            
+            sync = IMAPSync(self.test_config)
+            sync.uid_cache = UIDCache(cache_file)
+            message_ids = sync.search_emails(conn, 'INBOX', {'subject': 'Test'}, cache_key='key')
+            
+            conn.uid.assert_called_once_with('SEARCH', 'OR UID 5 MODSEQ 901 SUBJECT "Test"')
+            # Older messages that changed since the last run are kept
+            self.assertEqual(message_ids, [3, 5, 21])
+            
+            sync._record_uid_cache(message_ids, [3, 5, 21])
+            self.assertEqual(UIDCache(cache_file).get('key', 7), (21, [], 950))
+    
+    def test_run_sync_refuses_same_mailbox(self):
+        """Test that syncing a mailbox onto itself is refused before connecting."""
+        self.test_config['target_mailbox'] = dict(self.test_config['source_mailbox'])
+        
+        sync = IMAPSync(self.test_config)
+        with patch.object(sync, 'connect_imap') as mock_connect:
+            results = sync.run_sync(dry_run=False)
+        
+        mock_connect.assert_not_called()
+        self.assertEqual(results['errors'], 1)
+        self.assertEqual(results['deleted'], 0)
+    
+    def test_ensure_connected_reuses_live_connection(self):
+        """Test that daemon mode reuses open connections and reconnects closed ones."""
+        sync = IMAPSync(self.test_config)
+        live_conn = Mock(state='SELECTED')
+        new_conn = Mock()
+        
+        with patch.object(sync, 'connect_imap', return_value=new_conn) as mock_connect:
+            self.assertIs(sync._ensure_connected(live_conn, self.test_config['source_mailbox']), live_conn)
+            mock_connect.assert_not_called()
+            
+            closed_conn = Mock(state='LOGOUT')
+            self.assertIs(sync._ensure_connected(closed_conn, self.test_config['source_mailbox']), new_conn)
+            
+            # A connection dropped by the server fails its keepalive NOOP
+            sync._last_activity.clear()
+            live_conn.noop.side_effect = OSError('connection reset')
+            with patch('sync_mail.time.monotonic', return_value=10000.0):
+                self.assertIs(sync._ensure_connected(live_conn, self.test_config['source_mailbox']), new_conn)
+    
+    def test_target_pool_checks_each_connection(self):
+        """Test that an idle extra target connection is checked on its own and replaced if dead."""
+        config = dict(self.test_config, target_parallelism=2)
+        sync = IMAPSync(config)
+        target_conn, dead_conn, new_conn = Mock(state='SELECTED'), Mock(state='SELECTED'), Mock(state='AUTH')
+        dead_conn.noop.side_effect = OSError('connection reset')
+        sync.target_conn, sync._extra_target_conns = target_conn, [dead_conn]
+        
+        with patch('sync_mail.time.monotonic', return_value=10000.0), \
+             patch.object(sync, 'connect_imap', return_value=new_conn):
+            # The last cycle used target_conn, but not the extra connection
+            sync._last_activity[target_conn] = 10000.0
+            self.assertEqual(sync._connect_target_pool(), [target_conn, new_conn])
+        
+        target_conn.noop.assert_not_called()
+        dead_conn.noop.assert_called_once()
+    
+    def test_context_manager_keeps_connections(self):
+        """Test that run_sync reuses connections inside a with block and closes them on exit."""
+        connections = {'test.server.com': Mock(state='SELECTED'), 'target.server.com': Mock(state='SELECTED')}
+        sync = IMAPSync(self.test_config)
+        
+        with patch.object(sync, 'connect_imap', side_effect=lambda config: connections[config['server']]) as mock_connect, \
+                patch.object(sync, 'search_emails', return_value=[]):
+            with sync:
+                sync.run_sync()
+                sync.run_sync()
+                connections['test.server.com'].logout.assert_not_called()
+        
+        self.assertEqual(mock_connect.call_count, 2)
+        for conn in connections.values():
+            conn.logout.assert_called_once()
+        self.assertIsNone(sync.source_conn)
+    
+    def test_search_reuses_selected_folder(self):
+        """Test that repeat searches skip SELECT unless the UID cache needs fresh responses."""
+        sync = IMAPSync(self.test_config)
+        conn = Mock()
+        conn.select.return_value = ('OK', [b'3'])
+        conn.uid.return_value = ('OK', [b'1 2'])
+        
+        for _ in range(2):
+            self.assertEqual(sync.search_emails(conn, 'INBOX', {'subject': 'Test'}), [1, 2])
+        conn.select.assert_called_once_with('INBOX')
+    
+    def test_compact_uid_set(self):
+        """Test coalescing message IDs into IMAP sequence-set ranges."""
+        self.assertEqual(_compact_uid_set([b'12', b'1', b'7', b'8', b'9', b'3', b'10', b'11', b'44']), '1,3,7:12,44')
+        self.assertEqual(_compact_uid_set(['5']), '5')
+    
+    def test_verification_reuses_selected_folder(self):
+        """Test that repeated verification in the same folder sends SELECT once."""
+        conn = Mock()
+        conn.select.return_value = ('OK', [b'5'])
+        conn.uid.return_value = ('OK', [b''])
+        
+        sync = IMAPSync(self.test_config)
+        info = {'message_id': '<a@example.com>'}
+        sync.verify_message_exists(conn, 'Archive', info)
+        sync.verify_message_exists(conn, 'Archive', info)
+        conn.select.assert_called_once_with('Archive')
+        
+        sync.verify_message_exists(conn, 'INBOX', info)
+        self.assertEqual(conn.select.call_count, 2)
+    
+    def test_compressed_connection(self):
+        """Test that COMPRESS=DEFLATE wraps reads and writes in raw DEFLATE."""
+        deflater = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        server_data = deflater.compress(b'* 1 EXISTS\r\nA2 OK done\r\n') + deflater.flush(zlib.Z_SYNC_FLUSH)
+        
+        conn = Mock()
+        conn.capabilities = ('IMAP4REV1', 'COMPRESS=DEFLATE')
+        conn._simple_command.return_value = ('OK', [b'DEFLATE active'])
+        conn.file = io.BufferedReader(io.BytesIO(server_data))
+        
+        self.assertTrue(_enable_compression(conn))
+        conn._simple_command.assert_called_once_with('COMPRESS', 'DEFLATE')
+        self.assertEqual(conn.file.readline(), b'* 1 EXISTS\r\n')
+        self.assertEqual(conn.file.read(5), b'A2 OK')
+        
+        conn.send(b'A3 NOOP\r\n')
+        sent = conn.sock.sendall.call_args[0][0]
+        self.assertEqual(zlib.decompressobj(-15).decompress(sent), b'A3 NOOP\r\n')
+    
+    def test_iter_header_batches(self):
+        """Test that header batches are yielded in order while the next one is prefetched."""
+        sync = IMAPSync(self.test_config)
+        fetched = []
+        
+        def fake_infos(conn, batch):
+            fetched.append(batch)
+            return {message_id: {'message_id': str(message_id)} for message_id in batch}
+        
+        with patch('sync_mail.FETCH_BATCH_SIZE', 2), patch.object(sync, 'get_message_infos', side_effect=fake_infos):
+            batches = [batch for batch, infos in sync._iter_header_batches(Mock(), [1, 2, 3, 4, 5])]
+        
+        self.assertEqual(batches, [[1, 2], [3, 4], [5]])
+        self.assertEqual(fetched, batches)
+        
+        # A caller that stops early leaves the remaining batches unfetched
+        fetched.clear()
+        with patch('sync_mail.FETCH_BATCH_SIZE', 1), patch('sync_mail.HEADER_PREFETCH_DEPTH', 2), \
+                patch.object(sync, 'get_message_infos', side_effect=fake_infos):
+            batch_iter = sync._iter_header_batches(Mock(), [1, 2, 3, 4, 5])
+            self.assertEqual(next(batch_iter)[0], [1])
+            batch_iter.close()
+        self.assertLessEqual(len(fetched), 2)
+    
+    def test_prefetch_target_message_ids(self):
+        """Test that bulk verification only reports exact Message-ID matches."""
+        conn = Mock()
+        conn.select.return_value = ('OK', [b'2'])
+        conn.uid.side_effect = [
+            ('OK', [b'30 40']),
+            ('OK', [
+                (b'3 (UID 30 BODY[HEADER] {10}', b'Message-ID: <a@example.com>\r\n\r\n'), b')',
+                (b'4 (UID 40 BODY[HEADER] {10}', b'Message-ID: <xb@example.com>\r\n\r\n'), b')',
+            ]),
+        ]
+        
+        sync = IMAPSync(self.test_config)
+        found = sync.prefetch_target_message_ids(conn, 'INBOX', ['<a@example.com>', '<b@example.com>'])
+        
+        self.assertEqual(found, {'a@example.com': 30})
+        conn.uid.assert_any_call(
+            'SEARCH', '(OR HEADER Message-ID "a@example.com" HEADER Message-ID "b@example.com")')
+        
+        # Gmail targets are searched through Gmail's own index
+        conn.uid.reset_mock()
+        conn.uid.side_effect = [('OK', [b''])]
+        conn._allmail_folder = ''
+        sync.prefetch_target_message_ids(conn, 'INBOX', ['<a@example.com>', '<b@example.com>'], 'imap.gmail.com')
+        conn.uid.assert_called_once_with('SEARCH', 'X-GM-RAW', '"{rfc822msgid:a@example.com rfc822msgid:b@example.com}"')
+        
+        # IDs are quoted for HEADER, and ones Gmail's syntax cannot express skip X-GM-RAW
+        conn.uid.reset_mock()
+        conn.uid.side_effect = [('OK', [b''])]
+        sync.prefetch_target_message_ids(conn, 'INBOX', ['<a"b@example.com>', '<c}d@example.com>'], 'imap.gmail.com')
+        conn.uid.assert_called_once_with(
+            'SEARCH', '(OR HEADER Message-ID "a\\"b@example.com" HEADER Message-ID "c}d@example.com")')
+    
+    def test_build_target_index(self):
+        """Test indexing every Message-ID in the target folder."""
+        def target_uid(command, *args):
+            if command == 'SEARCH':
+                return 'OK', [b'4 5 6']
+            return 'OK', [
+                (b'1 (UID 4 BODY[HEADER.FIELDS (MESSAGE-ID)] {30}', b'Message-ID: <one@example.com>\r\n\r\n'), b')',
+                (b'2 (UID 5 BODY[HEADER.FIELDS (MESSAGE-ID)] {32}', b'message-id:\r\n <two@example.com>\r\n\r\n'), b')',
+                (b'3 (UID 6 BODY[HEADER.FIELDS (MESSAGE-ID)] {2}', b'\r\n'), b')',
+            ]
+        
+        conn = Mock()
+        conn.select.return_value = ('OK', [b'3'])
+        conn.uid.side_effect = target_uid
+        
+        sync = IMAPSync(self.test_config)
+        index = sync.build_target_index(conn, 'INBOX', 'target.server.com', since='01-Jan-2024')
+        
+        self.assertEqual(index, {'one@example.com': 4, 'two@example.com': 5})
+        conn.uid.assert_any_call('SEARCH', 'SINCE', '"01-Jan-2024"')
+        conn.uid.assert_any_call('FETCH', '4:6', '(BODY.PEEK[HEADER.FIELDS (MESSAGE-ID)])')
+
+    def test_prefetch_target_sharded(self):
+        """Test splitting the target lookup across parallel connections."""
+        sync = IMAPSync(self.test_config)
+        message_ids = [f'<m{i}@example.com>' for i in range(120)]
+        conns = [Mock(), Mock()]
+        calls = []
+
+        def prefetch(conn, folder, ids, server=''):
+            calls.append((conn, len(ids)))
+            return {ids[0].strip('<>'): conns.index(conn) + 1}
+
+        with patch.object(sync, 'prefetch_target_message_ids', side_effect=prefetch):
+            found = sync._prefetch_target_sharded(conns, 'INBOX', message_ids)
+
+        # 120 IDs are three 50-ID searches: two on the first connection, one on the second
+        self.assertEqual(sorted(calls, key=lambda call: call[1]), [(conns[1], 20), (conns[0], 100)])
+        self.assertEqual(found, {'m0@example.com': 1, 'm100@example.com': 2})
+
+    def test_search_arguments(self):
+        """Test quoting search values and sending non-ASCII ones as literals."""
+        self.assertEqual(build_imap_search({'subject': 'Say "hi" \\o/'}), 'SUBJECT "Say \\"hi\\" \\\\o/"')
+        
+        # A real IMAP4 (minus the network), so imaplib's own attributes are checked
+        conn = _OfflineIMAP4(('IMAP4REV1',))
+        self.assertEqual(_search_arguments(conn, ('SUBJECT "Report"',)), (('SUBJECT "Report"',), None))
+        self.assertEqual(_search_arguments(conn, ('UID 5:* SUBJECT "Caf\u00e9" FROM "a@b.co"',)),
+                         (('CHARSET', 'UTF-8', b'UID 5:* FROM "a@b.co" SUBJECT'), 'Caf\u00e9'.encode('utf-8')))
+        with self.assertRaises(Exception):
+            _search_arguments(conn, ('SUBJECT "Caf\u00e9" FROM "Jos\u00e9"',))
+        
+        conn.capabilities = ('IMAP4REV1', 'LITERAL+')
+        self.assertEqual(_search_arguments(conn, ('SUBJECT "Caf\u00e9" FROM "Jos\u00e9"',)),
+                         ((b'CHARSET UTF-8 SUBJECT {5+}\r\nCaf\xc3\xa9 FROM {5+}\r\nJos\xc3\xa9',), None))
+        
+        # After ENABLE UTF8=ACCEPT non-ASCII strings can be sent as they are
+        conn._mode_utf8()
+        self.assertEqual(_search_arguments(conn, ('SUBJECT "Caf\u00e9"',)), (('SUBJECT "Caf\u00e9"',), None))
+    
+    def test_safe_search_string(self):
+        """Test stripping non-ASCII, control characters and quotes from search text."""
+        sync = IMAPSync(self.test_config)
+        self.assertEqual(sync._safe_search_string('R\u00e9sum\u00e9 "Q3"\tplan'), 'Rsum Q3plan')
+        self.assertEqual(sync._safe_search_string('\u4f60\u597d'), '')
+        self.assertEqual(sync._safe_search_string('a@b.co'), 'a@b.co')
+        self.assertEqual(sync._safe_search_string('  Weekly   report '), 'Weekly report')
+        self.assertEqual(sync._safe_search_string('2024 123'), '')
     
     def test_header_decoding(self):
         """Test email header decoding."""
-        sync = IMAPSync(self.temp_config.name)
+        sync = IMAPSync(self.test_config)
         
         # Test simple string
         result = sync._decode_header("Simple Subject")
@@ -125,7 +788,27 @@ class TestEmailSync(unittest.TestCase):
         # Test None
         result = sync._decode_header(None)
         self.assertEqual(result, "")
+        
+        # Test encoded word
+        result = sync._decode_header("=?utf-8?b?Q2Fmw6k=?= menu")
+        self.assertEqual(result, "Caf\u00e9 menu")
 
+    
+    def test_parse_headers(self):
+        """Test extracting the verification headers from raw header bytes."""
+        headers = _parse_headers(
+            b'Received: from mx\r\n'
+            b'Subject: =?utf-8?q?Caf=C3=A9?=\r\n  menu\r\n'
+            b'from: Jos\xc3\xa9 <jose@example.com>\r\n'
+            b'Message-ID:\r\n <id@example.com>\r\n'
+            b'Message-ID: <second@example.com>\r\n\r\n'
+        )
+        
+        self.assertEqual(headers['message-id'], '<id@example.com>')
+        self.assertEqual(headers['from'], 'Jos\u00e9 <jose@example.com>')
+        self.assertNotIn('date', headers)
+        sync = IMAPSync(self.test_config)
+        self.assertEqual(sync._decode_header(headers['subject']), 'Caf\u00e9  menu')
 
 def run_tests():
     """Run all tests."""
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+UID cache for incremental email syncs
+
+Remembers, for each source folder and search, the highest UID already
+examined, the UIDs that were left in the source (not yet found in the
+target) and, on CONDSTORE servers, the folder's HIGHESTMODSEQ, so repeat
+runs only need to search new or changed messages plus those left over.
+Entries are only trusted while the folder's UIDVALIDITY is unchanged.
+"""
+
+import os
+from typing import Dict, List, Optional, Tuple
+
+# Parses and serializes with orjson when it is installed
+from json_compat import dumps, loads
+
+
+DEFAULT_UID_CACHE_FILE = os.path.join('~', '.cache', 'sync_mail', 'uidcache.json')
+
+
+class UIDCache:
+    """Persistent per-folder record of processed message UIDs."""
+
+    def __init__(self, cache_file: str = DEFAULT_UID_CACHE_FILE):
+        """Load the cache file, starting empty if it is missing or unreadable."""
+        self.cache_file = os.path.expanduser(cache_file)
+        self._entries: Dict[str, Dict] = self._load()
+
+    def _load(self) -> Dict[str, Dict]:
+        """Read the cache entries from disk."""
+        try:
+            with open(self.cache_file, 'rb') as f:
+                entries = loads(f.read())
+        except (OSError, ValueError):
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    @staticmethod
+    def make_key(server: str, username: str, folder: str, criteria: Dict) -> str:
+        """Build the cache key for a folder searched with the given criteria."""
+        return f"{username}@{server}/{folder}?{dumps(criteria, sort_keys=True)}"
+
+    def get(self, key: str, uidvalidity: int) -> Optional[Tuple[int, List[int], int]]:
+        """Get the (last seen UID, pending UIDs, HIGHESTMODSEQ) recorded for a folder.
+
+        The HIGHESTMODSEQ is 0 when the server did not support CONDSTORE.
+
+        Returns:
+            None if nothing is cached or the cached UIDVALIDITY differs
+        """
+        entry = self._entries.get(key)
+        if not isinstance(entry, dict) or entry.get('uidvalidity') != uidvalidity:
+            return None
+        return entry.get('last_uid', 0), entry.get('pending', []), entry.get('highestmodseq', 0)
+
+    def update(self, key: str, uidvalidity: int, last_uid: int, pending: List[int],
+               highestmodseq: int = 0):
+        """Record the state of a folder, replacing any entry for an older UIDVALIDITY."""
+        self._entries[key] = {
+            'uidvalidity': uidvalidity,
+            'last_uid': last_uid,
+            'pending': sorted(pending),
+            'highestmodseq': highestmodseq,
+        }
+
+    def save(self):
+        """Write the cache to disk atomically."""
+        directory = os.path.dirname(self.cache_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_file = f"{self.cache_file}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            f.write(dumps(self._entries))
+        os.replace(temp_file, self.cache_file)